@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+# (c) 2021-2023, Bodo Schulz <bodo@boone-schulz.de>
+# Apache-2.0 (see LICENSE or https://opensource.org/license/apache-2-0/)
+# SPDX-License-Identifier: Apache-2.0
+
+# runs snakeoil_openssl inside the controller process, when the task
+# is executed on localhost. every other task is handed over to the module.
+
+from __future__ import absolute_import, print_function
+import importlib.util
+import os
+import sys
+
+import ansible.module_utils
+from ansible.module_utils.common.arg_spec import ArgumentSpecValidator
+from ansible.module_utils.common.process import get_bin_path
+from ansible.plugins.action import ActionBase
+from ansible.utils.display import Display
+
+__metaclass__ = type
+
+display = Display()
+
+
+class ModuleFailed(Exception):
+    """
+    """
+
+    def __init__(self, result):
+        super().__init__(result.get("msg"))
+        self.result = result
+
+
+class ControllerModule(object):
+    """
+      the parts of AnsibleModule, which SnakeoilOpenssl uses
+    """
+
+    def __init__(self, params):
+        """
+        """
+        self.params = params
+        self.warnings = []
+
+    def log(self, msg):
+        """
+        """
+        display.vvvv(msg)
+
+    def warn(self, warning):
+        """
+        """
+        self.warnings.append(warning)
+
+    def fail_json(self, msg, **kwargs):
+        """
+        """
+        raise ModuleFailed(dict(failed=True, msg=msg, **kwargs))
+
+    def get_bin_path(self, arg, required=False):
+        """
+        """
+        try:
+            return get_bin_path(arg)
+        except ValueError as e:
+            if required:
+                self.fail_json(msg=str(e))
+
+        return None
+
+
+class ActionModule(ActionBase):
+    """
+    """
+    TRANSFERS_FILES = False
+
+    def run(self, tmp=None, task_vars=None):
+        """
+        """
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp
+
+        if not self._runs_on_controller():
+            result.update(self._execute_module(module_name="snakeoil_openssl", task_vars=task_vars))
+            return result
+
+        library = self._load_library()
+
+        validation = ArgumentSpecValidator(
+            library.argument_spec(),
+            mutually_exclusive=library.MUTUALLY_EXCLUSIVE,
+            required_one_of=library.REQUIRED_ONE_OF
+        ).validate(self._task.args)
+
+        if validation.error_messages:
+            result.update(failed=True, msg=", ".join(validation.error_messages))
+            return result
+
+        module = ControllerModule(validation.validated_parameters)
+        cwd = os.getcwd()
+
+        try:
+            result.update(library.execute(module))
+        except ModuleFailed as e:
+            result.update(e.result)
+        finally:
+            os.chdir(cwd)
+
+        display.vvv(f"= result : '{result}'")
+
+        if module.warnings:
+            result["warnings"] = result.get("warnings", []) + module.warnings
+
+        return result
+
+    def _runs_on_controller(self):
+        """
+          only a local connection without privilege escalation and check mode
+          can use the controller process
+        """
+        local = getattr(self._connection, "transport", None) == "local"
+
+        return local and not self._play_context.become and not self._task.check_mode
+
+    def _load_library(self):
+        """
+          import library/snakeoil_openssl.py and make the role module_utils
+          importable as 'ansible.module_utils.snakeoil_*'
+        """
+        name = "ansible_snakeoil_openssl"
+
+        if name in sys.modules:
+            return sys.modules[name]
+
+        context = self._shared_loader_obj.module_loader.find_plugin_with_context(
+            "snakeoil_openssl",
+            collection_list=self._task.collections
+        )
+
+        module_utils = os.path.join(os.path.dirname(os.path.dirname(context.plugin_resolved_path)), "module_utils")
+
+        if os.path.isdir(module_utils) and module_utils not in ansible.module_utils.__path__:
+            ansible.module_utils.__path__.append(module_utils)
+
+        spec = importlib.util.spec_from_file_location(name, context.plugin_resolved_path)
+        library = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(library)
+
+        sys.modules[name] = library
+
+        return library
@@ -0,0 +1,130 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# (c) 2021-2023, Bodo Schulz <bodo@boone-schulz.de>
+# Apache-2.0 (see LICENSE or https://opensource.org/license/apache-2-0/)
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import absolute_import, print_function
+import hashlib
+import os
+import re
+
+from ansible.module_utils.basic import AnsibleModule
+
+
+__metaclass__ = type
+
+ANSIBLE_METADATA = {
+    'metadata_version': '0.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+
+class SnakeoilArchive(object):
+    """
+      Main Class
+    """
+    module = None
+
+    def __init__(self, module):
+        """
+          Initialize all needed Variables
+        """
+        self.module = module
+
+        self.directory = module.params.get("directory")
+        self.domain = module.params.get("domain")
+
+    def run(self):
+        """
+          sha256 and mode of every file in '<directory>/<domain>', for snakeoil_install.
+          archives, which were created by older versions of the role, are removed.
+        """
+        base_directory = os.path.join(self.directory, self.domain)
+
+        if not os.path.isdir(base_directory):
+            return dict(
+                failed=True,
+                changed=False,
+                msg=f"missing directory {base_directory}"
+            )
+
+        files = dict()
+
+        for name in sorted(os.listdir(base_directory)):
+            file_name = os.path.join(base_directory, name)
+
+            if name.startswith(".") or not os.path.isfile(file_name):
+                continue
+
+            with open(file_name, "rb") as f:
+                content = f.read()
+
+            files[name] = dict(
+                checksum=hashlib.sha256(content).hexdigest(),
+                mode=f"{os.stat(file_name).st_mode & 0o777:04o}"
+            )
+
+        removed = self._remove_archives()
+
+        return dict(
+            failed=False,
+            changed=len(removed) > 0,
+            files=files,
+            removed=removed
+        )
+
+    def _remove_archives(self):
+        """
+          '<domain>_<hash>.tgz' of older versions are never used again
+        """
+        removed = []
+
+        # exactly '<domain>_<hash>.tgz', the archives of 'foo_bar' are not the ones of 'foo'
+        pattern = re.compile(rf"^{re.escape(self.domain)}_[0-9a-f]{{16}}\.tgz$")
+
+        for name in os.listdir(self.directory):
+            if pattern.match(name):
+                os.remove(os.path.join(self.directory, name))
+                removed.append(name)
+
+        return removed
+
+
+# ===========================================
+# Module execution.
+#
+
+
+def main():
+    """
+    """
+    args = dict(
+        directory=dict(
+            required=True,
+            type="path"
+        ),
+        domain=dict(
+            required=True,
+            type="path"
+        ),
+    )
+
+    module = AnsibleModule(
+        argument_spec=args,
+        supports_check_mode=False,
+    )
+
+    archive = SnakeoilArchive(module)
+    result = archive.run()
+
+    module.log(msg=f"= result : '{result}'")
+
+    module.exit_json(**result)
+
+
+# import module snippets
+if __name__ == '__main__':
+    main()
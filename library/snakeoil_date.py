@@ -5,20 +5,22 @@
 # BSD 2-clause (see LICENSE or https://opensource.org/licenses/BSD-2-Clause)
 
 from __future__ import absolute_import, print_function
+import hashlib
+import json
 import os
 import re
+import tempfile
 from enum import Enum
-from datetime import datetime
+from datetime import datetime, timezone
 
 from ansible.module_utils.basic import AnsibleModule
-
-from ansible_collections.community.crypto.plugins.module_utils.crypto.module_backends.certificate_info import (
-    get_certificate_info,
-)
-
-from ansible_collections.community.crypto.plugins.module_utils.crypto.support import (
-    get_relative_time_option,
-)
+from ansible.module_utils.snakeoil_cache import MetadataCache
+from ansible.module_utils.snakeoil_lock import domain_lock
+from ansible.module_utils.snakeoil_manifest import Manifest
+from ansible.module_utils.snakeoil_metrics import render_metrics, write_textfile
+from ansible.module_utils.snakeoil_renewal import renewal_date
+from ansible.module_utils.snakeoil_timing import Timings, run_command, startup_usage
+from ansible.module_utils.snakeoil_x509 import certificate_alt_names, certificate_key_info, certificate_validity
 
 
 __metaclass__ = type
@@ -57,12 +59,25 @@ class SnakeoilDate(object):
         """
         self.module = module
 
-        self.openssl_bin = module.get_bin_path('openssl', True)
+        self.openssl_bin = module.get_bin_path('openssl', False)
         self.snakeoil_directory = module.params.get("snakeoil_directory")
         self.snakeoil_domain = module.params.get("snakeoil_domain")
         self.pattern = module.params.get("pattern")
-
-        self.use_openssl = False
+        self.inventory = module.params.get("inventory")
+        self.index_file = module.params.get("index_file") or os.path.join(self.snakeoil_directory, ".snakeoil_date_index.json")
+
+        self.backend = module.params.get("backend")
+        self.renew_before = module.params.get("renew_before")
+        self.renew_window = module.params.get("renew_window")
+        self.worker_socket = module.params.get("worker_socket")
+        self.worker_idle_timeout = module.params.get("worker_idle_timeout")
+        self.worker = None
+        self.timings = Timings(module.params.get("timings"))
+        self.metrics_file = module.params.get("metrics_file")
+        self.metrics = dict()
+
+        cache_file = module.params.get("cache_file")
+        self.cache = MetadataCache(cache_file, module.params.get("cache_size")) if cache_file else None
 
         # import locale
         # self.module.log(msg=f"  - language: '{locale.getdefaultlocale()}'")
@@ -70,26 +85,285 @@ class SnakeoilDate(object):
     def run(self):
         """
         """
+        with self.timings.phase("inventory" if self.inventory else "domain"):
+            if self.inventory:
+                result = self.run_inventory()
+            else:
+                result = self.run_domain()
+
+            if self.cache:
+                with self.timings.phase("write"):
+                    self.cache.save()
+
+            if self.metrics_file:
+                with self.timings.phase("write"):
+                    write_textfile(self.metrics_file, render_metrics(self.metrics))
+
+        if self.timings.enabled:
+            result["timings"] = self.timings.result()
+
+        return result
+
+    def run_domain(self):
+        """
+          expire date of '<snakeoil_domain>/<snakeoil_domain>.pem'
+        """
         result = dict(
             failed=False,
             changed=False,
             expire_date="none",
-            diff_days=0
+            diff_days=0,
+            renew_now=False
         )
 
         certificate = os.path.join(self.snakeoil_directory, self.snakeoil_domain, self.snakeoil_domain + ".pem")
 
         if os.path.isfile(certificate):
+            # wait for a run, which is creating the certificate right now
+            with self.timings.phase("lock"):
+                lock = domain_lock(self.snakeoil_directory, self.snakeoil_domain, shared=True)
+
+            with lock:
+                facts = self._certificate_facts(certificate)
+
+            if facts.get("not_after"):
+                result = self.calculate_diff(facts.get("not_after"), domain=self.snakeoil_domain, date_not_before=facts.get("not_before"))
+
+            result.update(self._key_info(facts))
+            self._collect_metrics(self.snakeoil_domain, facts, result)
+
+        return result
+
+    def run_inventory(self):
+        """
+          expire date of every '<domain>/<domain>.pem' below snakeoil_directory.
+
+          parsed facts are kept in an index keyed by path, inode, mtime and size,
+          so an unchanged certificate is parsed only once.
+        """
+        index = self._read_index()
+        new_index = dict()
+        certificates = dict()
+
+        if not os.path.isdir(self.snakeoil_directory):
+            return dict(
+                failed=False,
+                changed=False,
+                certificates=certificates
+            )
+
+        with os.scandir(self.snakeoil_directory) as it:
+            for entry in it:
+                if entry.name.startswith(".") or not entry.is_dir(follow_symlinks=False):
+                    continue
+
+                certificate = os.path.join(entry.path, f"{entry.name}.pem")
+
+                try:
+                    st = os.stat(certificate)
+                except FileNotFoundError:
+                    continue
+
+                fingerprint = [st.st_ino, st.st_mtime_ns, st.st_size]
+                cached = index.get(certificate, {})
+
+                if cached.get("stat") == fingerprint:
+                    facts = cached.get("facts")
+                else:
+                    facts = self._certificate_facts(certificate)
+
+                new_index[certificate] = dict(stat=fingerprint, facts=facts)
 
-            if self.use_openssl:
+                domain = dict(expire_date="none", diff_days=0, renew_now=False)
+
+                if facts.get("not_after"):
+                    domain = self.calculate_diff(facts.get("not_after"), domain=entry.name, date_not_before=facts.get("not_before"))
+                    domain.pop("failed", None)
+                    domain.pop("changed", None)
+
+                domain.update(self._key_info(facts))
+                certificates[entry.name] = domain
+
+                self._collect_metrics(entry.name, facts, domain)
+
+        if new_index != index:
+            self._write_index(new_index)
+
+        return dict(
+            failed=False,
+            changed=False,
+            certificates=certificates
+        )
+
+    def _certificate_facts(self, certificate):
+        """
+          everything we need to know from one certificate,
+          in a json serializable form (for the inventory index)
+        """
+        data = None
+        date_not_after = None
+
+        try:
+            with self.timings.phase("read"), open(certificate, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError) as e:
+            msg = f'Error while reading pem file from disk: {e}'
+            self.module.log(msg)
+            self.module.fail_json(msg)
+
+        digest = hashlib.sha256(data).hexdigest()
+
+        if self.cache:
+            facts = self.cache.get("date", digest)
+
+            if facts is not None:
+                self.module.log(msg=f"  cache hit for {certificate}")
+                return dict(facts)
+
+        # the selected backend first, the slower ones as fallback
+        backends = ["asn1", "cryptography", "openssl"]
+        backends = backends[backends.index(self.backend):]
+
+        for backend in backends:
+            if backend == "asn1":
+                with self.timings.phase("parse"):
+                    date_not_after = self._asn1(data)
+            elif backend == "cryptography":
+                date_not_after = self._worker(data) or self._crypto(certificate)
+            elif backend == "openssl" and self.openssl_bin:
                 date_not_after = self._exec_openssl(certificate)
-            else:
-                date_not_after = self._crypto(certificate)
 
             if date_not_after:
-                result = self.calculate_diff(date_not_after)
+                break
 
-        return result
+        facts = dict(
+            not_after=str(date_not_after) if date_not_after else None
+        )
+
+        with self.timings.phase("parse"):
+            # for the renewal date, which never moves before the middle of the validity period
+            try:
+                facts["not_before"] = certificate_validity(data)[0].strftime("%Y-%m-%d %H:%M:%S")
+            except (ValueError, IndexError) as e:
+                self.module.log(msg=f"  unable to read notBefore: {e}")
+
+            try:
+                key_info = certificate_key_info(data)
+
+                facts["key_type"] = key_info.get("type")
+                facts["key_size"] = key_info.get("size")
+            except (ValueError, IndexError) as e:
+                self.module.log(msg=f"  unable to read the public key: {e}")
+
+            try:
+                facts["alt_names"] = certificate_alt_names(data)
+            except (ValueError, IndexError) as e:
+                self.module.log(msg=f"  unable to read the alt names: {e}")
+
+        if self.cache and facts.get("not_after"):
+            self.cache.put("date", digest, facts)
+
+        return facts
+
+    def _asn1(self, data):
+        """
+          read notAfter straight from the DER encoded certificate
+        """
+        try:
+            date_not_before, date_not_after = certificate_validity(data)
+        except (ValueError, IndexError) as e:
+            self.module.log(msg=f"  unable to parse the certificate: {e}")
+            return None
+
+        self.module.log(msg=f"  - date_not_before: '{date_not_before}'")
+        self.module.log(msg=f"  - date_not_after : '{date_not_after}'")
+
+        return date_not_after.strftime("%Y-%m-%d %H:%M:%S")
+
+    def _read_index(self):
+        """
+        """
+        try:
+            with open(self.index_file, "r") as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return dict()
+
+    def _write_index(self, index):
+        """
+          replace the index atomically
+        """
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(self.index_file), prefix=".snakeoil_date_index.")
+
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f)
+
+        os.replace(tmp_file, self.index_file)
+
+    def _collect_metrics(self, domain, facts, result):
+        """
+          values for the textfile of the node_exporter: certificate, dh.pem
+          and the last generation, recorded in the manifest by snakeoil_openssl
+        """
+        if not self.metrics_file:
+            return
+
+        base_directory = os.path.join(self.snakeoil_directory, domain)
+        generation = Manifest(os.path.join(base_directory, ".snakeoil_manifest.json")).generation or dict()
+
+        values = dict(
+            key_type=facts.get("key_type"),
+            key_size=facts.get("key_size"),
+            dhparam_size=self._dhparam_size(os.path.join(base_directory, "dh.pem")),
+            generation_time=generation.get("time"),
+            generation_duration=generation.get("duration")
+        )
+
+        try:
+            not_after = datetime.strptime(str(facts.get("not_after")), "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+
+            values.update(
+                not_after=int(not_after.timestamp()),
+                diff_days=result.get("diff_days"),
+                renew_now=result.get("renew_now")
+            )
+        except ValueError:
+            pass
+
+        self.metrics[domain] = values
+
+    def _dhparam_size(self, file_name):
+        """
+          None without (or with an unreadable) dh.pem
+        """
+        try:
+            with self.timings.phase("read"), open(file_name, "rb") as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+
+        digest = hashlib.sha256(data).hexdigest()
+        info = self.cache.get("dhparam", digest) if self.cache else None
+
+        if info is None:
+            from ansible.module_utils.snakeoil_dhparam import dhparam_info
+
+            try:
+                with self.timings.phase("parse"):
+                    info = dhparam_info(data)
+            except ValueError as e:
+                self.module.log(msg=f"  unreadable {file_name}: {e}")
+                return None
+
+            if self.cache:
+                self.cache.put("dhparam", digest, info)
+
+        return info.get("size")
+
+    def _key_info(self, facts):
+        """
+        """
+        return {k: v for k, v in facts.items() if k in ["key_type", "key_size"]}
 
     def _exec_openssl(self, certificate):
         """
@@ -122,7 +396,7 @@ class SnakeoilDate(object):
         if rc == 0:
             date_not_after = out.rstrip("\n")
             # reorg date string (see https://github.com/bodsch/ansible-snakeoil/issues/4)
-            pattern = re.compile(r".*=(?P<month>.{3}) (?P<day>\d+) (?P<hour>\d+):(?P<minute>\d+):(?P<second>\d{2}) (?P<year>\d{4}) GMT$")
+            pattern = re.compile(r".*=(?P<month>.{3})\s+(?P<day>\d+) (?P<hour>\d+):(?P<minute>\d+):(?P<second>\d{2}) (?P<year>\d{4}) GMT$")
             date_pattern = re.search(pattern, date_not_after)
 
             self.module.log(msg=f"  - date_pattern: '{date_pattern}'")
@@ -144,12 +418,51 @@ class SnakeoilDate(object):
 
         return result
 
+    def _worker(self, data):
+        """
+          ask the keygen worker, it has the cryptography stack already loaded
+        """
+        if not self.worker_socket:
+            return None
+
+        if self.worker is None:
+            from ansible.module_utils.snakeoil_worker import connect_worker
+
+            self.worker = connect_worker(self.worker_socket, self.worker_idle_timeout) or False
+
+        if not self.worker:
+            return None
+
+        with self.timings.phase("worker"):
+            response = self.worker.request("certificate", pem=data.decode())
+
+        if response is None:
+            self.module.log(msg=f"  worker failed: {self.worker.error}")
+            return None
+
+        date_not_after = datetime.fromisoformat(response.get("not_after"))
+        self.module.log(msg=f"  - date_not_after : '{date_not_after}'")
+
+        return date_not_after.strftime("%Y-%m-%d %H:%M:%S")
+
     def _crypto(self, certificate):
         """
         """
         result = None
         data = None
 
+        # imported on demand, the collection and the cryptography stack are expensive to load
+        try:
+            from ansible_collections.community.crypto.plugins.module_utils.crypto.module_backends.certificate_info import (
+                get_certificate_info,
+            )
+            from ansible_collections.community.crypto.plugins.module_utils.crypto.support import (
+                get_relative_time_option,
+            )
+        except ImportError as e:
+            self.module.log(msg=f"  community.crypto is not available: {e}")
+            return None
+
         try:
             with open(certificate, 'rb') as f:
                 data = f.read()
@@ -159,7 +472,8 @@ class SnakeoilDate(object):
             self.module.fail_json(msg)
 
         if data:
-            info = get_certificate_info(self.module, 'cryptography', data)
+            with self.timings.phase("parse"):
+                info = get_certificate_info(self.module, 'cryptography', data)
 
             # self.module.log(msg=f"  - info: '{info}'")
 
@@ -174,8 +488,9 @@ class SnakeoilDate(object):
 
         return result
 
-    def calculate_diff(self, date_not_after, datetime_format="%Y-%m-%d %H:%M:%S"):
+    def calculate_diff(self, date_not_after, datetime_format="%Y-%m-%d %H:%M:%S", domain=None, date_not_before=None):
         """
+          days until the certificate expires and, with <domain>, the renewal decision
         """
         result = dict(
             failed=False,
@@ -185,13 +500,14 @@ class SnakeoilDate(object):
         )
 
         try:
-            _cert_date = datetime.strptime(str(date_not_after), str(datetime_format))
-            _current_date = datetime.now()
+            # the dates of a certificate are UTC
+            _not_after = datetime.strptime(str(date_not_after), str(datetime_format)).replace(tzinfo=timezone.utc)
+            _current_date = datetime.now(timezone.utc)
 
-            diff_days = (_cert_date - _current_date)
+            diff_days = (_not_after - _current_date)
             diff_days = diff_days.days
 
-            _cert_date = _cert_date.strftime(self.pattern)
+            _cert_date = _not_after.strftime(self.pattern)
 
             self.module.log(msg=f"expire_date  '{_cert_date}'")
             self.module.log(msg=f"diff days    '{diff_days}'")
@@ -203,6 +519,16 @@ class SnakeoilDate(object):
                 diff_days=diff_days
             )
 
+            if domain:
+                _not_before = None
+                if date_not_before:
+                    _not_before = datetime.strptime(str(date_not_before), str(datetime_format)).replace(tzinfo=timezone.utc)
+
+                renew_at = renewal_date(domain, _not_after, self.renew_before, self.renew_window, _not_before)
+
+                result["renew_at"] = renew_at.strftime(self.pattern)
+                result["renew_now"] = _current_date >= renew_at
+
         except ValueError as e:
             self.module.log(msg=f" ERROR '{e}'")
 
@@ -227,7 +553,11 @@ class SnakeoilDate(object):
         """
         self.module.log(msg="args: {}".format(args))
 
-        rc, out, err = self.module.run_command(args, check_rc=False)
+        # not module.run_command, the pid is needed for the peak rss of this call
+        with self.timings.subprocess(f"{os.path.basename(args[0])} {args[1]}") as children:
+            rc, out, err, max_rss_kb = run_command(args)
+            children.append(max_rss_kb)
+
         # self.module.log(msg=f"  rc : '{rc}'")
         # self.module.log(msg=f"  out: '{str(out)}'")
         # self.module.log(msg=f"  err: '{err}'")
@@ -243,17 +573,46 @@ def main():
     """
 
     """
+    # interpreter start and module imports
+    startup = startup_usage()
+
     module = AnsibleModule(
         argument_spec=dict(
             snakeoil_directory=dict(required=True, type="path"),
-            snakeoil_domain=dict(required=True, type="path"),
-            pattern=dict(type="str", default="%Y-%m-%dT%H:%M:%S")
+            snakeoil_domain=dict(required=False, type="path"),
+            pattern=dict(type="str", default="%Y-%m-%dT%H:%M:%S"),
+            backend=dict(type="str", default="asn1", choices=["asn1", "cryptography", "openssl"]),
+            inventory=dict(type="bool", default=False),
+            index_file=dict(required=False, type="path"),
+            cache_file=dict(required=False, type="path"),
+            cache_size=dict(type="int", default=1024),
+            renew_before=dict(type="int", default=10),
+            renew_window=dict(type="int", default=0),
+            worker_socket=dict(required=False, type="path"),
+            worker_idle_timeout=dict(type="int", default=600),
+            timings=dict(type="bool", default=False),
+            profile_directory=dict(required=False, type="path"),
+            metrics_file=dict(required=False, type="path")
         ),
+        required_if=[
+            ("inventory", False, ["snakeoil_domain"]),
+        ],
         supports_check_mode=False,
     )
 
-    icingacli = SnakeoilDate(module)
-    result = icingacli.run()
+    # cProfile and pstats are only loaded, when a profile is requested
+    if module.params.get("profile_directory") or os.environ.get("SNAKEOIL_PROFILE_DIR"):
+        from ansible.module_utils.snakeoil_profile import Profiler
+
+        with Profiler(module.params.get("profile_directory"), "snakeoil_date") as profiler:
+            result = SnakeoilDate(module).run()
+
+        result["profile"] = profiler.files
+    else:
+        result = SnakeoilDate(module).run()
+
+    if module.params.get("timings"):
+        result.setdefault("timings", dict())["startup"] = startup
 
     module.log(msg=f"= result : '{result}'")
 
@@ -0,0 +1,196 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# (c) 2021-2023, Bodo Schulz <bodo@boone-schulz.de>
+# Apache-2.0 (see LICENSE or https://opensource.org/license/apache-2-0/)
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import absolute_import, print_function
+import base64
+import binascii
+import hashlib
+import os
+import tempfile
+
+from ansible.module_utils.basic import AnsibleModule
+
+
+__metaclass__ = type
+
+ANSIBLE_METADATA = {
+    'metadata_version': '0.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+
+class SnakeoilInstall(object):
+    """
+      Main Class
+    """
+    module = None
+
+    def __init__(self, module):
+        """
+          Initialize all needed Variables
+        """
+        self.module = module
+
+        self.dest = module.params.get("dest")
+        self.domain = module.params.get("domain")
+        self.files = module.params.get("files")
+        self.content = module.params.get("content") or dict()
+
+    def run(self):
+        """
+          compare the file manifest with the installed files.
+          without 'content' only the outdated files are reported,
+          with 'content' these files are written.
+          files of the domain, which are not in the manifest (anymore), are removed.
+        """
+        base_directory = os.path.join(self.dest, self.domain)
+
+        removed = self._remove_stale(base_directory)
+        outdated = [name for name in sorted(self.files) if not self._is_current(base_directory, name)]
+
+        if not outdated or not self.content:
+            return dict(
+                failed=False,
+                changed=len(removed) > 0,
+                outdated=outdated,
+                removed=removed
+            )
+
+        os.makedirs(base_directory, mode=0o750, exist_ok=True)
+
+        written = []
+
+        for name in outdated:
+            if name not in self.content:
+                continue
+
+            self._install(base_directory, name, self._decode(name))
+            written.append(name)
+
+        return dict(
+            failed=False,
+            changed=len(written) > 0 or len(removed) > 0,
+            written=written,
+            outdated=[name for name in outdated if name not in written],
+            removed=removed
+        )
+
+    def _remove_stale(self, base_directory):
+        """
+          '<domain>*' files, which dropped out of the manifest
+          (e.g. split certificates or the chain), would keep old keys on the host
+        """
+        removed = []
+
+        if not os.path.isdir(base_directory):
+            return removed
+
+        for name in sorted(os.listdir(base_directory)):
+            file_name = os.path.join(base_directory, name)
+
+            if name.startswith(self.domain) and name not in self.files and os.path.isfile(file_name):
+                os.remove(file_name)
+                removed.append(name)
+
+        return removed
+
+    def _is_current(self, base_directory, name):
+        """
+        """
+        file_name = os.path.join(base_directory, name)
+        wanted = self.files.get(name, {})
+
+        try:
+            st = os.stat(file_name)
+            with open(file_name, "rb") as f:
+                checksum = hashlib.sha256(f.read()).hexdigest()
+        except FileNotFoundError:
+            return False
+
+        return checksum == wanted.get("checksum") and f"{st.st_mode & 0o777:04o}" == wanted.get("mode", "0600")
+
+    def _decode(self, name):
+        """
+          content must match the checksum of the manifest
+        """
+        try:
+            data = base64.b64decode(self.content.get(name), validate=True)
+        except (binascii.Error, TypeError) as e:
+            self.module.fail_json(msg=f"invalid content for {name}: {e}")
+
+        if hashlib.sha256(data).hexdigest() != self.files.get(name, {}).get("checksum"):
+            self.module.fail_json(msg=f"checksum mismatch for {name}")
+
+        return data
+
+    def _install(self, base_directory, name, data):
+        """
+          write to a temporary file in the same directory and move it into place.
+          the temporary file (0600 from mkstemp) gets the final mode before the
+          rename, a key is never visible with wider permissions.
+        """
+        fd, tmp_file = tempfile.mkstemp(dir=base_directory, prefix=f".{name}.")
+
+        file_name = os.path.join(base_directory, name)
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+
+            os.chmod(tmp_file, int(self.files.get(name, {}).get("mode", "0600"), 8))
+            os.replace(tmp_file, file_name)
+        except OSError as e:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            self.module.fail_json(msg=f"unable to install {file_name}: {e}")
+
+
+# ===========================================
+# Module execution.
+#
+
+
+def main():
+    """
+    """
+    args = dict(
+        dest=dict(
+            required=True,
+            type="path"
+        ),
+        domain=dict(
+            required=True,
+            type="str"
+        ),
+        files=dict(
+            required=True,
+            type="dict"
+        ),
+        content=dict(
+            required=False,
+            type="dict",
+            no_log=True
+        ),
+    )
+
+    module = AnsibleModule(
+        argument_spec=args,
+        supports_check_mode=False,
+    )
+
+    install = SnakeoilInstall(module)
+    result = install.run()
+
+    module.log(msg=f"= result : '{result}'")
+
+    module.exit_json(**result)
+
+
+# import module snippets
+if __name__ == '__main__':
+    main()
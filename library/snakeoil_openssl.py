@@ -6,11 +6,29 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from __future__ import absolute_import, print_function
+import datetime
+import fcntl
+import hashlib
+import importlib.util
+import multiprocessing
 import os
-import re
-
-from ansible.module_utils.basic import AnsibleModule
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 
+from ansible.module_utils.basic import AnsibleModule, missing_required_lib
+from ansible.module_utils.snakeoil_cache import MetadataCache
+from ansible.module_utils.snakeoil_config import normalize_alt_names, read_openssl_config, render_openssl_config, request_settings, split_alt_names
+from ansible.module_utils.snakeoil_dhparam import DHParamPool, DHParamStore, dhparam_info, ffdhe_group, generate_parallel
+from ansible.module_utils.snakeoil_asn1 import ASN1Error, pem_to_der
+from ansible.module_utils.snakeoil_lock import domain_lock
+from ansible.module_utils.snakeoil_manifest import Manifest, file_digest, inputs_digest
+from ansible.module_utils.snakeoil_profile import Profiler
+from ansible.module_utils.snakeoil_renewal import renewal_date
+from ansible.module_utils.snakeoil_timing import Timings, run_command, startup_usage
+from ansible.module_utils.snakeoil_worker import connect_worker
+from ansible.module_utils.snakeoil_x509 import certificate_alt_names, certificate_key_info, certificate_validity, private_key_info
 
 __metaclass__ = type
 
@@ -21,6 +39,20 @@ ANSIBLE_METADATA = {
 }
 
 
+# a task works on one 'domain' or on a list of 'domains'
+MUTUALLY_EXCLUSIVE = [("domain", "domains")]
+REQUIRED_ONE_OF = [("domain", "domains")]
+
+# parallel dh parameter searches with dhparam_workers 0, more seldom
+# pay off and every search keeps one cpu busy
+DHPARAM_WORKERS_DEFAULT = 4
+
+# parameters, which can be set per entry of 'domains'
+DOMAIN_OPTIONS = [
+    "domain", "alt_names", "san_limit", "dn", "email", "key_type", "key_size", "cert_life_time", "dhparam", "dhparam_mode"
+]
+
+
 class SnakeoilOpenssl(object):
     """
       Main Class
@@ -33,25 +65,68 @@ class SnakeoilOpenssl(object):
         """
         self.module = module
 
-        self._openssl = module.get_bin_path('openssl', True)
         self.state = module.params.get("state")
+        self.backend = module.params.get("backend")
         self.directory = module.params.get("directory")
         self.domain = module.params.get("domain")
         self.dhparam = module.params.get("dhparam")
+        self.dhparam_mode = module.params.get("dhparam_mode")
+        self.dhparam_pool = module.params.get("dhparam_pool")
+        self.dhparam_pool_depth = module.params.get("dhparam_pool_depth")
+        self.dhparam_store = module.params.get("dhparam_store")
+        self.dhparam_workers = module.params.get("dhparam_workers")
         self.cert_life_time = module.params.get("cert_life_time")
+        self.force = module.params.get("force")
+        self.renew = module.params.get("renew")
+        self.key_type = module.params.get("key_type")
+        self.key_size = module.params.get("key_size")
         self.openssl_config = module.params.get("openssl_config")
+        self.alt_names = module.params.get("alt_names")
+        self.san_limit = module.params.get("san_limit")
+        self.dn = module.params.get("dn")
+        self.email = module.params.get("email") or f"cert@{self.domain}"
+        self.ca_directory = module.params.get("ca_directory")
+        self.ca_common_name = module.params.get("ca_common_name")
+        self.ca_life_time = module.params.get("ca_life_time")
+        self.renew_before = module.params.get("renew_before")
+        self.renew_window = module.params.get("renew_window")
+        self.cache_file = module.params.get("cache_file")
+        self.cache_size = module.params.get("cache_size")
+        self.worker_socket = module.params.get("worker_socket")
+        self.worker_idle_timeout = module.params.get("worker_idle_timeout")
+        self.timings = Timings(module.params.get("timings"))
+
+        # only look for cryptography here, it is imported when the work is not done by the worker
+        if self.backend == "cryptography" and importlib.util.find_spec("cryptography") is None:
+            self.module.warn(f"{missing_required_lib('cryptography')}: falling back to the openssl backend")
+            self.backend = "openssl"
+
+        if self.backend == "openssl":
+            self._openssl = module.get_bin_path('openssl', True)
+        else:
+            # cryptography creates DH parameters only with a CryptographyDeprecationWarning (FFDH),
+            # the cryptography backend leaves them to openssl, whenever there is one
+            self._openssl = module.get_bin_path('openssl', False)
+
+        if self.key_type == "ec" and self.key_size not in [None, 256, 384, 521]:
+            self.module.fail_json(msg=f"unsupported curve size {self.key_size} for key_type 'ec' (use 256, 384 or 521)")
+
+        # in-memory artifacts, shared between the steps of the cryptography backend
+        self._key = None
+        self._key_pem = None
+        self._csr_pem = None
+
+        self.worker = None
+        self._ca_digest = None
 
     def run(self):
         """
         """
-        result = dict(
-            failed=True,
-            changed=False,
-            msg="failed"
-        )
-
         base_directory = os.path.join(self.directory, self.domain)
 
+        if self.state == "bundle":
+            os.makedirs(base_directory, mode=0o750, exist_ok=True)
+
         if not os.path.isdir(base_directory):
             return dict(
                 failed=True,
@@ -60,143 +135,1029 @@ class SnakeoilOpenssl(object):
             )
 
         os.chdir(base_directory)
-        _ssl_args = []
 
-        csr_file = os.path.join(self.directory, self.domain, f"{self.domain}.csr")
-        crt_file = os.path.join(self.directory, self.domain, f"{self.domain}.crt")
-        pem_file = os.path.join(self.directory, self.domain, f"{self.domain}.pem")
-        key_file = os.path.join(self.directory, self.domain, f"{self.domain}.key")
-        dh_file = os.path.join(self.directory, self.domain, "dh.pem")
+        if self.worker_socket and self.backend == "cryptography":
+            self.worker = connect_worker(self.worker_socket, self.worker_idle_timeout, [[self.key_type, self._key_size()]])
+            self.module.log(msg=f"  worker: {'connected' if self.worker else 'not running'}")
 
-        if self.state == "csr":
-            _ssl_args.append(self._openssl)
-            _ssl_args.append("req")
-            _ssl_args.append("-new")
-            _ssl_args.append("-sha512")
-            _ssl_args.append("-nodes")
-            _ssl_args.append("-out")
-            _ssl_args.append(csr_file)
-            _ssl_args.append("-newkey")
-            _ssl_args.append("rsa:4096")
-            _ssl_args.append("-keyout")
-            _ssl_args.append(key_file)
-            _ssl_args.append("-config")
-            _ssl_args.append(self.openssl_config)
+        self.base_directory = base_directory
+        self.key_file = os.path.join(base_directory, f"{self.domain}.key")
+        self.dh_file = os.path.join(base_directory, "dh.pem")
+        self.manifest_file = os.path.join(base_directory, ".snakeoil_manifest.json")
 
-            rc, out, err = self._exec(_ssl_args)
+        self._use_part(1)
 
-            result = dict(
-                failed=False,
-                changed=True,
-                msg="success"
-            )
+        if self.ca_directory:
+            self.ca_key_file = os.path.join(self.ca_directory, "snakeoil-ca.key")
+            self.ca_crt_file = os.path.join(self.ca_directory, "snakeoil-ca.crt")
 
-        if self.state == "crt":
-            _ssl_args.append(self._openssl)
-            _ssl_args.append("x509")
-            _ssl_args.append("-req")
-            _ssl_args.append("-in")
-            _ssl_args.append(csr_file)
-            _ssl_args.append("-out")
-            _ssl_args.append(crt_file)
-            _ssl_args.append("-signkey")
-            _ssl_args.append(key_file)
-            _ssl_args.append("-extfile")
-            _ssl_args.append(self.openssl_config)
-            _ssl_args.append("-extensions")
-            _ssl_args.append("req_ext")
-            _ssl_args.append("-days")
-            _ssl_args.append(str(self.cert_life_time))
+        # concurrent runs on the same domain (e.g. parallel CI jobs) wait for each other
+        started = time.monotonic()
 
-            rc, out, err = self._exec(_ssl_args)
+        with self.timings.phase("lock"):
+            lock = domain_lock(self.directory, self.domain, shared=self.state in ["inspect", "dhparam_size"])
 
-            # cat {{ domain }}.crt {{ domain }}.key >> {{ domain }}.pem
-            if rc == 0:
-                filenames = [crt_file, key_file]
-                with open(pem_file, 'w') as outfile:
-                    for fname in filenames:
-                        with open(fname) as infile:
-                            outfile.write(infile.read())
-
-            result = dict(
+        with lock:
+            waited = time.monotonic() - started
+
+            if waited > 1:
+                self.module.log(msg=f"  waited {waited:.1f}s for the lock of {self.domain}")
+
+            with self.timings.phase(self.state):
+                result = self._run_state()
+
+        if self.timings.enabled:
+            result["timings"] = self.timings.result()
+
+        return result
+
+    def _run_state(self):
+        """
+        """
+        if self.state == "bundle":
+            return self._bundle()
+
+        if self.state == "inspect":
+            return self._inspect()
+
+        if self.state == "dhparam_size":
+            info = self._dhparam_info()
+
+            return dict(
                 failed=False,
-                changed=True,
-                msg="success"
+                changed=False,
+                size=info.get("size"),
+                group=info.get("group")
             )
 
+        if self.state == "csr":
+            self._create_csr()
+
+        if self.state == "crt":
+            self._create_crt()
+
         if self.state == "dhparam":
-            _ssl_args.append(self._openssl)
-            _ssl_args.append("dhparam")
-            _ssl_args.append("-5")
-            _ssl_args.append("-out")
-            _ssl_args.append(dh_file)
-            _ssl_args.append(str(self.dhparam))
+            self._create_dhparam()
 
-            rc, out, err = self._exec(_ssl_args)
+        return dict(
+            failed=False,
+            changed=True,
+            msg="success"
+        )
 
-            result = dict(
-                failed=False,
-                changed=True,
-                msg="success"
+    def _bundle(self):
+        """
+          render the openssl config and create every missing or outdated
+          artifact (key, csr, crt, pem, dh.pem) within one module run.
+
+          the manifest next to the artifacts records the inputs of every
+          artifact, only artifacts with changed inputs are created again.
+          'renew' issues a new certificate for the existing key and csr.
+        """
+        artifacts = []
+        manifest = Manifest(self.manifest_file)
+        started = time.monotonic()
+
+        if self.renew and not self._renewal_due():
+            # a concurrent run has renewed the certificate while we waited for the lock
+            self.module.log(msg="  certificate is already renewed")
+            self.renew = False
+
+        try:
+            parts = split_alt_names(normalize_alt_names(self.alt_names), self.san_limit)
+        except ValueError as e:
+            return dict(failed=True, changed=False, msg=str(e))
+
+        # the first part also creates the key, the others share it
+        for index, alt_names in enumerate(parts, start=1):
+            self._use_part(index)
+            artifacts += self._bundle_part(manifest, index, alt_names)
+
+        artifacts += self._remove_parts(manifest, len(parts))
+        self._use_part(1)
+
+        # dh.pem
+        dh_inputs = inputs_digest(self.dhparam, self.dhparam_mode)
+        new_dhparam = self.force or not manifest.is_current("dhparam", dh_inputs, self.dh_file)
+
+        if new_dhparam and not self.force and not manifest.has("dhparam"):
+            # adopt a sufficient dh.pem created before the manifest existed
+            dh_info = self._dhparam_info()
+            new_dhparam = dh_info.get("size") < self.dhparam or (self.dhparam_mode == "ffdhe" and not dh_info.get("group"))
+
+        if new_dhparam:
+            self._create_dhparam()
+            artifacts.append("dhparam")
+        elif self.dhparam_store and self.dhparam_mode == "generate":
+            self._share_dhparam()
+
+        manifest.update("dhparam", dh_inputs, self.dh_file)
+
+        if artifacts:
+            # for the metrics of snakeoil_date
+            manifest.generation = dict(
+                time=int(time.time()),
+                duration=round(time.monotonic() - started, 3),
+                artifacts=artifacts
             )
 
-        if self.state == "dhparam_size":
-            _ssl_args.append(self._openssl)
-            _ssl_args.append("dhparam")
-            _ssl_args.append("-in")
-            _ssl_args.append(dh_file)
-            _ssl_args.append("-text")
+        manifest.save()
 
-            rc, out, err = self._exec(_ssl_args)
+        key_info = self._wanted_key()
 
-            if rc == 0:
-                """
-                """
-                output_string = 0
-                pattern = re.compile(r".*DH Parameters: \((?P<size>\d+) bit\).*")
+        result = dict(
+            failed=False,
+            changed=len(artifacts) > 0,
+            artifacts=artifacts,
+            certificates=[self._part_name(index) + ".crt" for index in range(1, len(parts) + 1)],
+            key_type=key_info.get("type"),
+            key_size=key_info.get("size"),
+            msg="success" if artifacts else "all artifacts are up to date"
+        )
 
-                result = re.search(pattern, out)
-                if result:
-                    output_string = result.group('size')
+        if self.ca_directory:
+            result["ca_certificate"] = self.ca_crt_file
 
-            result = dict(
-                failed=False,
-                changed=False,
-                size=int(output_string)
+        return result
+
+    def _renewal_due(self):
+        """
+          the renewal date of the existing certificate is reached
+        """
+        try:
+            not_before, not_after = certificate_validity(self._read(self.pem_file))
+        except (IOError, OSError, ASN1Error, ValueError, IndexError):
+            return True
+
+        renew_at = renewal_date(self.domain, not_after, self.renew_before, self.renew_window, not_before)
+
+        return datetime.datetime.now(datetime.timezone.utc) >= renew_at
+
+    def _bundle_part(self, manifest, index, alt_names):
+        """
+          conf, csr, crt, pem (and chain) of one certificate.
+          the manifest entries of part <n> carry the suffix '.<n>'
+        """
+        suffix = "" if index == 1 else f".{index}"
+        artifacts = []
+
+        with self.timings.phase("render"):
+            config = render_openssl_config(self.domain, self.dn, self.email, alt_names, bits=self._key_size(4096))
+
+        conf_inputs = inputs_digest(config)
+
+        if self.force or not manifest.is_current(f"conf{suffix}", conf_inputs, self.conf_file):
+            if not os.path.isfile(self.conf_file) or self._read(self.conf_file) != config.encode():
+                self._write(self.conf_file, config.encode(), mode=0o640)
+                artifacts.append(f"conf{suffix}")
+
+            manifest.update(f"conf{suffix}", conf_inputs, self.conf_file)
+
+        self.openssl_config = self.conf_file
+
+        # key
+        new_key = False
+
+        if index == 1:
+            key_inputs = inputs_digest(self._wanted_key())
+            new_key = self.force or not manifest.is_current("key", key_inputs, self.key_file)
+
+            if new_key and not self.force and not manifest.has("key") and self._key_info() == self._wanted_key():
+                # adopt a matching key created before the manifest existed
+                new_key = False
+
+            if new_key:
+                self._create_csr()
+                artifacts += ["key", "csr"]
+
+            manifest.update("key", key_inputs, self.key_file)
+
+        # csr
+        csr_inputs = inputs_digest(manifest.sha256(f"conf{suffix}"), manifest.sha256("key"))
+
+        if not new_key and (self.force or not manifest.is_current(f"csr{suffix}", csr_inputs, self.csr_file)):
+            self._create_csr(new_key=False)
+            artifacts.append(f"csr{suffix}")
+
+        manifest.update(f"csr{suffix}", csr_inputs, self.csr_file)
+
+        # crt and pem (and the chain, when the CA signs)
+        crt_inputs = [manifest.sha256(f"csr{suffix}"), self.cert_life_time]
+        if self.ca_directory:
+            crt_inputs.append(self._ca())
+
+        crt_inputs = inputs_digest(*crt_inputs)
+        pem_inputs = inputs_digest(manifest.sha256(f"crt{suffix}"), manifest.sha256("key"))
+        chain_inputs = inputs_digest(manifest.sha256(f"crt{suffix}"), self._ca_digest)
+
+        crt_current = manifest.is_current(f"crt{suffix}", crt_inputs, self.crt_file)
+        pem_current = manifest.is_current(f"pem{suffix}", pem_inputs, self.pem_file)
+        chain_current = not self.ca_directory or manifest.is_current(f"chain{suffix}", chain_inputs, self.chain_file)
+
+        if self.force or self.renew or not crt_current or not pem_current or not chain_current:
+            self._create_crt()
+            artifacts += [f"crt{suffix}", f"pem{suffix}"] + ([f"chain{suffix}"] if self.ca_directory else [])
+
+        manifest.update(f"crt{suffix}", crt_inputs, self.crt_file)
+        manifest.update(f"pem{suffix}", inputs_digest(manifest.sha256(f"crt{suffix}"), manifest.sha256("key")), self.pem_file)
+
+        if self.ca_directory:
+            manifest.update(f"chain{suffix}", inputs_digest(manifest.sha256(f"crt{suffix}"), self._ca_digest), self.chain_file)
+        elif os.path.isfile(self.chain_file):
+            # left over from the CA mode
+            os.remove(self.chain_file)
+            manifest.remove(f"chain{suffix}")
+            artifacts.append(f"chain{suffix}")
+
+        return artifacts
+
+    def _remove_parts(self, manifest, count):
+        """
+          certificates of a former, longer list of alt names
+        """
+        removed = []
+        index = count + 1
+
+        while manifest.has(f"conf.{index}"):
+            self._use_part(index)
+
+            for name, file_name in [("conf", self.conf_file), ("csr", self.csr_file), ("crt", self.crt_file), ("pem", self.pem_file), ("chain", self.chain_file)]:
+                if os.path.isfile(file_name):
+                    os.remove(file_name)
+                manifest.remove(f"{name}.{index}")
+
+            removed.append(f"part.{index}")
+            index += 1
+
+        return removed
+
+    def _part_name(self, index):
+        """
+          file name (without extension) of the <index>th certificate
+        """
+        return self.domain if index == 1 else f"{self.domain}.{index}"
+
+    def _use_part(self, index):
+        """
+          point conf, csr, crt, pem and chain to the files of the <index>th certificate,
+          1 is the main certificate
+        """
+        name = os.path.join(self.base_directory, self._part_name(index))
+
+        self.conf_file = f"{name}.conf"
+        self.csr_file = f"{name}.csr"
+        self.crt_file = f"{name}.crt"
+        self.pem_file = f"{name}.pem"
+        self.chain_file = f"{name}.chain.crt"
+
+        self._csr_pem = None
+
+    def _inspect(self):
+        """
+          everything about the existing certificate (the key facts come from
+          its public key) and dh.pem, parsed in-process within one call
+        """
+        result = dict(
+            failed=False,
+            changed=False,
+            exists=os.path.isfile(self.pem_file),
+            expire_date="none",
+            diff_days=0,
+            renew_now=False
+        )
+
+        if result["exists"]:
+            try:
+                facts = self._certificate_facts(self._read(self.pem_file))
+            except (ASN1Error, ValueError, IndexError) as e:
+                return dict(failed=True, changed=False, msg=f"unreadable {self.pem_file}: {e}")
+
+            not_before = datetime.datetime.strptime(facts.get("not_before"), "%Y-%m-%d %H:%M:%S").replace(tzinfo=datetime.timezone.utc)
+            not_after = datetime.datetime.strptime(facts.get("not_after"), "%Y-%m-%d %H:%M:%S").replace(tzinfo=datetime.timezone.utc)
+            now = datetime.datetime.now(datetime.timezone.utc)
+            renew_at = renewal_date(self.domain, not_after, self.renew_before, self.renew_window, not_before)
+
+            result.update(
+                expire_date=facts.get("not_after"),
+                diff_days=(not_after - now).days,
+                renew_at=renew_at.strftime("%Y-%m-%d %H:%M:%S"),
+                renew_now=now >= renew_at,
+                key_type=facts.get("key_type"),
+                key_size=facts.get("key_size"),
+                alt_names=facts.get("alt_names"),
+                fingerprint=facts.get("fingerprint")
             )
 
+        dh_info = self._dhparam_info()
+
+        result.update(
+            dhparam_size=dh_info.get("size"),
+            dhparam_group=dh_info.get("group")
+        )
+
         return result
 
+    def _certificate_facts(self, data):
+        """
+          facts of the first certificate in <data>, cached by its sha256
+        """
+        cache = MetadataCache(self.cache_file, self.cache_size) if self.cache_file else None
+        digest = hashlib.sha256(data).hexdigest()
+
+        facts = cache.get("inspect", digest) if cache else None
+
+        if facts is None:
+            with self.timings.phase("parse"):
+                der = pem_to_der(data, "CERTIFICATE")
+                not_before, not_after = certificate_validity(data)
+                key_info = certificate_key_info(data)
+
+                facts = dict(
+                    not_before=not_before.strftime("%Y-%m-%d %H:%M:%S"),
+                    not_after=not_after.strftime("%Y-%m-%d %H:%M:%S"),
+                    key_type=key_info.get("type"),
+                    key_size=key_info.get("size"),
+                    alt_names=certificate_alt_names(data),
+                    fingerprint=":".join(f"{b:02X}" for b in hashlib.sha256(der).digest())
+                )
+
+            if cache:
+                cache.put("inspect", digest, facts)
+
+        if cache:
+            cache.save()
+
+        return facts
+
+    def _create_csr(self, new_key=True):
+        """
+          create the certificate request, with a new private key
+          or for the existing one
+        """
+        if self.backend == "cryptography":
+            with self.timings.phase("parse"):
+                settings = request_settings(read_openssl_config(self.openssl_config))
+
+            key_size = self._key_size(settings.get("bits"))
+
+            if new_key:
+                self._key_pem = self._from_worker("key", key_type=self.key_type, key_size=key_size)
+
+                if self._key_pem is None:
+                    crypto = self._crypto()
+
+                    with self.timings.phase("crypto"):
+                        self._key = crypto.generate_private_key(self.key_type, key_size)
+                        self._key_pem = crypto.private_key_pem(self._key)
+
+                self._write(self.key_file, self._key_pem, mode=0o600)
+            else:
+                self._key_pem = self._read(self.key_file)
+
+            self._csr_pem = self._from_worker(
+                "csr",
+                key=self._key_pem.decode(),
+                subject=settings.get("subject"),
+                alt_names=settings.get("alt_names"),
+                digest=settings.get("digest")
+            )
+
+            if self._csr_pem is None:
+                crypto = self._crypto()
+
+                with self.timings.phase("crypto"):
+                    self._csr_pem = crypto.csr_pem(
+                        crypto.build_csr(self._private_key(), settings.get("subject"), settings.get("alt_names"), settings.get("digest"))
+                    )
+
+            self._write(self.csr_file, self._csr_pem)
+            return
+
+        _ssl_args = []
+        _ssl_args.append(self._openssl)
+        _ssl_args.append("req")
+        _ssl_args.append("-new")
+        if self.key_type != "ed25519":
+            _ssl_args.append("-sha512")
+        _ssl_args.append("-nodes")
+        _ssl_args.append("-out")
+        _ssl_args.append(self.csr_file)
+        if new_key:
+            _ssl_args.append("-newkey")
+            if self.key_type == "ec":
+                _ssl_args.append("ec")
+                _ssl_args.append("-pkeyopt")
+                _ssl_args.append(f"ec_paramgen_curve:P-{self._key_size()}")
+            elif self.key_type == "ed25519":
+                _ssl_args.append("ed25519")
+            else:
+                _ssl_args.append(f"rsa:{self._key_size(4096)}")
+            _ssl_args.append("-keyout")
+        else:
+            _ssl_args.append("-key")
+        _ssl_args.append(self.key_file)
+        _ssl_args.append("-config")
+        _ssl_args.append(self.openssl_config)
+
+        self._exec(_ssl_args)
+
+    def _create_crt(self):
+        """
+          sign the certificate request with its own key (or the key of the CA)
+          and bundle certificate and key into the pem
+        """
+        if self.ca_directory:
+            self._ca()
+
+        if self.backend == "cryptography":
+            with self.timings.phase("parse"):
+                settings = request_settings(read_openssl_config(self.openssl_config))
+
+            if self._key_pem is None:
+                self._key_pem = self._read(self.key_file)
+            if self._csr_pem is None:
+                self._csr_pem = self._read(self.csr_file)
+
+            if self.ca_directory:
+                ca_key, ca_crt = self._read(self.ca_key_file), self._read(self.ca_crt_file)
+                crypto = self._crypto()
+
+                with self.timings.phase("crypto"):
+                    crt_pem = crypto.certificate_pem(
+                        crypto.build_certificate(
+                            crypto.load_csr(self._csr_pem),
+                            crypto.load_private_key(ca_key),
+                            self.cert_life_time,
+                            settings.get("digest"),
+                            ca_cert=crypto.load_certificate(ca_crt)
+                        )
+                    )
+            else:
+                crt_pem = self._from_worker(
+                    "crt",
+                    csr=self._csr_pem.decode(),
+                    key=self._key_pem.decode(),
+                    days=self.cert_life_time,
+                    digest=settings.get("digest")
+                )
+
+            if crt_pem is None:
+                crypto = self._crypto()
+
+                with self.timings.phase("crypto"):
+                    crt_pem = crypto.certificate_pem(
+                        crypto.build_certificate(
+                            crypto.load_csr(self._csr_pem), self._private_key(), self.cert_life_time, settings.get("digest")
+                        )
+                    )
+
+            self._write(self.crt_file, crt_pem)
+            # cat {{ domain }}.crt {{ domain }}.key >> {{ domain }}.pem
+            self._write(self.pem_file, crt_pem + self._key_pem, mode=0o600)
+            self._write_chain()
+            return
+
+        _ssl_args = []
+        _ssl_args.append(self._openssl)
+        _ssl_args.append("x509")
+        _ssl_args.append("-req")
+        _ssl_args.append("-in")
+        _ssl_args.append(self.csr_file)
+        _ssl_args.append("-out")
+        _ssl_args.append(self.crt_file)
+        if self.ca_directory:
+            _ssl_args.append("-CA")
+            _ssl_args.append(self.ca_crt_file)
+            _ssl_args.append("-CAkey")
+            _ssl_args.append(self.ca_key_file)
+            _ssl_args.append("-set_serial")
+            _ssl_args.append(f"0x{random.SystemRandom().getrandbits(159):x}")
+        else:
+            _ssl_args.append("-signkey")
+            _ssl_args.append(self.key_file)
+        _ssl_args.append("-extfile")
+        _ssl_args.append(self.openssl_config)
+        _ssl_args.append("-extensions")
+        _ssl_args.append("req_ext")
+        _ssl_args.append("-days")
+        _ssl_args.append(str(self.cert_life_time))
+
+        rc, out, err = self._exec(_ssl_args)
+
+        # cat {{ domain }}.crt {{ domain }}.key >> {{ domain }}.pem
+        if rc == 0:
+            self._write(self.pem_file, self._read(self.crt_file) + self._read(self.key_file), mode=0o600)
+
+            self._write_chain()
+
+    def _write_chain(self):
+        """
+          certificate followed by the CA certificate
+        """
+        if self.ca_directory:
+            self._write(self.chain_file, self._read(self.crt_file) + self._read(self.ca_crt_file))
+
+    def _ca(self):
+        """
+          create the root key and certificate once and share them
+          between all domains. returns the sha256 of the CA certificate.
+        """
+        if self._ca_digest:
+            return self._ca_digest
+
+        os.makedirs(self.ca_directory, mode=0o700, exist_ok=True)
+
+        # parallel runs (batch mode) must not create two different CAs
+        with open(os.path.join(self.ca_directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            if not os.path.isfile(self.ca_key_file) or not os.path.isfile(self.ca_crt_file):
+                self._create_ca()
+
+        self._ca_digest = file_digest(self.ca_crt_file)
+
+        return self._ca_digest
+
+    def _create_ca(self):
+        """
+          EC P-384 root, it only signs and is created once
+        """
+        self.module.log(msg=f"  create CA '{self.ca_common_name}' in {self.ca_directory}")
+
+        if self.backend == "cryptography":
+            crypto = self._crypto()
+
+            key = crypto.generate_private_key("ec", 384)
+            cert = crypto.build_ca_certificate(key, self.ca_common_name, self.ca_life_time)
+
+            self._write(self.ca_key_file, crypto.private_key_pem(key), mode=0o600)
+            self._write(self.ca_crt_file, crypto.certificate_pem(cert))
+            return
+
+        _ssl_args = []
+        _ssl_args.append(self._openssl)
+        _ssl_args.append("req")
+        _ssl_args.append("-x509")
+        _ssl_args.append("-new")
+        _ssl_args.append("-nodes")
+        _ssl_args.append("-sha384")
+        _ssl_args.append("-newkey")
+        _ssl_args.append("ec")
+        _ssl_args.append("-pkeyopt")
+        _ssl_args.append("ec_paramgen_curve:P-384")
+        _ssl_args.append("-keyout")
+        _ssl_args.append(self.ca_key_file)
+        _ssl_args.append("-out")
+        _ssl_args.append(self.ca_crt_file)
+        _ssl_args.append("-days")
+        _ssl_args.append(str(self.ca_life_time))
+        _ssl_args.append("-subj")
+        _ssl_args.append(f"/CN={self.ca_common_name}")
+        _ssl_args.append("-addext")
+        _ssl_args.append("basicConstraints=critical,CA:TRUE,pathlen:0")
+        _ssl_args.append("-addext")
+        _ssl_args.append("keyUsage=critical,keyCertSign,cRLSign")
+
+        self._exec(_ssl_args)
+
+        os.chmod(self.ca_key_file, 0o600)
+
+    def _create_dhparam(self):
+        """
+          link the shared parameters of the store (if configured),
+          only the first domain of a size generates them.
+          with dhparam_mode 'ffdhe' the matching RFC 7919 group is written instead.
+        """
+        if self.dhparam_mode == "ffdhe":
+            group = ffdhe_group(self.dhparam)
+
+            if not group:
+                self.module.fail_json(msg=f"there is no RFC 7919 group with {self.dhparam} bits or more")
+
+            self._write(self.dh_file, group[1])
+            return
+
+        if not self.dhparam_store:
+            self._generate_dhparam()
+            return
+
+        store = DHParamStore(self.dhparam_store)
+
+        with store.lock(self.dhparam):
+            linked = store.link(self.dhparam, self.dh_file)
+
+            self.module.log(msg=f"  dhparam store: {'hit' if linked else 'miss'}")
+
+            if not linked:
+                self._generate_dhparam()
+                store.add(self.dh_file)
+
+    def _share_dhparam(self):
+        """
+          the dh.pem of a domain, created before the store existed,
+          becomes the stored parameters of its size
+        """
+        store = DHParamStore(self.dhparam_store)
+        size = self._dhparam_info().get("size")
+
+        if not size or store.entry(size):
+            return
+
+        with store.lock(size):
+            store.add(self.dh_file)
+
+    def _generate_dhparam(self):
+        """
+          take the parameters from the pool (if configured) and
+          fall back to a synchronous generation when the pool is empty,
+          with more than one dhparam worker the first of parallel searches wins.
+        """
+        # a hardlink into the store must never be overwritten in place
+        if os.path.isfile(self.dh_file) and os.stat(self.dh_file).st_nlink > 1:
+            os.remove(self.dh_file)
+
+        if self.dhparam_pool:
+            pool = DHParamPool(self.dhparam_pool, self.module.get_bin_path('openssl', False))
+            taken = pool.take(self.dhparam, self.dh_file)
+            started = 0
+
+            # with the store, parameters of this size are generated once, a refill would never be used
+            if not self.dhparam_store:
+                started = pool.refill(self.dhparam, self.dhparam_pool_depth)
+
+            self.module.log(msg=f"  dhparam pool: {'hit' if taken else 'miss'}, {started} refill worker started")
+
+            if taken:
+                os.chmod(self.dh_file, 0o644)
+                return
+
+        workers = self.dhparam_workers or min(DHPARAM_WORKERS_DEFAULT, os.cpu_count() or 1)
+
+        if workers > 1:
+            with self.timings.subprocess("dhparam parallel") as children:
+                generated = generate_parallel(self.dhparam, self.dh_file, workers, self._openssl, children)
+
+            if generated:
+                os.chmod(self.dh_file, 0o644)
+                return
+
+            self.module.log(msg=f"  none of the {workers} dhparam workers succeeded")
+
+        if not self._openssl:
+            data = self._from_worker("dhparam", bits=self.dhparam)
+
+            if data is None:
+                with self.timings.phase("crypto"):
+                    data = self._crypto().generate_dhparam(self.dhparam)
+
+            self._write(self.dh_file, data)
+            return
+
+        _ssl_args = []
+        _ssl_args.append(self._openssl)
+        _ssl_args.append("dhparam")
+        _ssl_args.append("-5")
+        _ssl_args.append("-out")
+        _ssl_args.append(self.dh_file)
+        _ssl_args.append(str(self.dhparam))
+
+        self._exec(_ssl_args)
+
+    def _crypto(self):
+        """
+          snakeoil_crypto, imported on first use. loading cryptography is the
+          most expensive part of a run, a run served by the worker never pays it.
+        """
+        from ansible.module_utils import snakeoil_crypto
+
+        if not snakeoil_crypto.HAS_CRYPTOGRAPHY:
+            self.module.fail_json(msg=missing_required_lib("cryptography"))
+
+        return snakeoil_crypto
+
+    def _private_key(self):
+        """
+          the key object is only needed, when the worker does not sign
+        """
+        if self._key is None:
+            self._key = self._crypto().load_private_key(self._key_pem)
+
+        return self._key
+
+    def _from_worker(self, op, **args):
+        """
+          <op> result of the worker as bytes, None without worker (or on errors)
+        """
+        if not self.worker:
+            return None
+
+        with self.timings.phase("worker"):
+            response = self.worker.request(op, **args)
+
+        if response is None:
+            self.module.log(msg=f"  worker {op} failed: {self.worker.error}")
+            return None
+
+        return response.get(op).encode()
+
+    def _key_size(self, default=4096):
+        """
+          requested key size, curve size for 'ec'
+        """
+        if self.key_type == "ed25519":
+            return 256
+
+        if self.key_type == "ec":
+            return self.key_size or 256
+
+        return self.key_size or default
+
+    def _wanted_key(self):
+        """
+        """
+        return dict(
+            type=self.key_type,
+            size=self._key_size()
+        )
+
+    def _key_info(self):
+        """
+          type and size of the existing private key, empty if there is none
+        """
+        if os.path.isfile(self.key_file):
+            try:
+                return private_key_info(self._read(self.key_file))
+            except ValueError as e:
+                self.module.log(msg=f"  unreadable {self.key_file}: {e}")
+
+        return dict()
+
+    def _dhparam_info(self):
+        """
+          bit size and RFC 7919 group of the existing dh.pem,
+          size is 0 if there is none (or it is not readable)
+        """
+        info = dict(size=0, group=None)
+
+        if not os.path.isfile(self.dh_file):
+            return info
+
+        cache = MetadataCache(self.cache_file, self.cache_size) if self.cache_file else None
+        digest = file_digest(self.dh_file)
+
+        # the size of shared parameters is known from the store index
+        stored = DHParamStore(self.dhparam_store).info(digest) if self.dhparam_store else None
+
+        if stored:
+            return stored
+
+        if cache and cache.get("dhparam", digest) is not None:
+            info = cache.get("dhparam", digest)
+        else:
+            data = self._read(self.dh_file)
+
+            try:
+                with self.timings.phase("parse"):
+                    info = dhparam_info(data)
+            except ValueError as e:
+                self.module.log(msg=f"  unreadable {self.dh_file}: {e}")
+                return info
+
+            if cache:
+                cache.put("dhparam", digest, info)
+
+        if cache:
+            cache.save()
+
+        return info
+
+    def _read(self, file_name):
+        """
+        """
+        with self.timings.phase("read"), open(file_name, "rb") as f:
+            return f.read()
+
+    def _write(self, file_name, data, mode=0o644):
+        """
+          write to a temporary file and move it into place,
+          readers never see a partly written file
+        """
+        with self.timings.phase("write"):
+            fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(file_name), prefix=f".{os.path.basename(file_name)}.")
+
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+
+            os.chmod(tmp_file, mode)
+            os.replace(tmp_file, file_name)
+
     def _exec(self, args):
         """
         """
         self.module.log(msg="args: {}".format(args))
 
-        rc, out, err = self.module.run_command(args, check_rc=True)
+        # not module.run_command, the pid is needed for the peak rss of this call
+        with self.timings.subprocess(f"{os.path.basename(args[0])} {args[1]}") as children:
+            rc, out, err, max_rss_kb = run_command(args)
+            children.append(max_rss_kb)
+
         self.module.log(msg="  rc : '{}'".format(rc))
         if rc != 0:
             self.module.log(msg="  out: '{}'".format(str(out)))
             self.module.log(msg="  err: '{}'".format(err))
+            self.module.fail_json(msg=err.strip() or f"'{args[0]}' failed with rc {rc}", rc=rc, stdout=out, stderr=err)
 
         return rc, out, err
 
 
+class DomainFailed(Exception):
+    """
+    """
+    pass
+
+
+class DomainModule(object):
+    """
+      the module, seen by one domain of a batch:
+      own parameters, and a failure only ends this domain
+    """
+
+    def __init__(self, module, params):
+        """
+        """
+        self.module = module
+        self.params = params
+        self.warnings = []
+
+    def log(self, msg):
+        """
+        """
+        self.module.log(msg=f"[{self.params.get('domain')}] {msg}")
+
+    def warn(self, warning):
+        """
+        """
+        self.warnings.append(warning)
+
+    def fail_json(self, msg, **kwargs):
+        """
+        """
+        raise DomainFailed(msg)
+
+    def get_bin_path(self, arg, required=False):
+        """
+        """
+        path = self.module.get_bin_path(arg, False)
+
+        if required and not path:
+            self.fail_json(msg=f"Failed to find required executable '{arg}'")
+
+        return path
+
+
+class SnakeoilBatch(object):
+    """
+      one SnakeoilOpenssl per entry of 'domains', spread over
+      a process pool with one process per cpu
+    """
+
+    def __init__(self, module):
+        """
+        """
+        self.module = module
+        self.domains = module.params.get("domains")
+
+    def run(self):
+        """
+        """
+        entries = [self._params(entry) for entry in self.domains]
+        workers = min(len(entries), os.cpu_count() or 1)
+
+        if workers > 1:
+            # the domains already use the cpus, share the rest between their dh searches
+            for params in entries:
+                params["dhparam_workers"] = params.get("dhparam_workers") or max(1, min(DHPARAM_WORKERS_DEFAULT, (os.cpu_count() or 1) // workers))
+
+        self.module.log(msg=f"  batch: {len(entries)} domains, {workers} processes")
+
+        if workers < 2:
+            results = [run_domain(self.module, params) for params in entries]
+        else:
+            # fork: the workers inherit the module (and its connection to ansible)
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_batch_init,
+                initargs=(self.module,)
+            ) as executor:
+                results = list(executor.map(_batch_run, entries))
+
+        failures = [r.get("domain") for r in results if r.get("failed")]
+        warnings = [w for r in results for w in r.pop("warnings", [])]
+
+        for warning in warnings:
+            self.module.warn(warning)
+
+        return dict(
+            failed=len(failures) > 0,
+            changed=any(r.get("changed") for r in results),
+            results=results,
+            failures=failures,
+            msg=f"failed: {', '.join(failures)}" if failures else "success"
+        )
+
+    def _params(self, entry):
+        """
+          module parameters, overwritten by the values of the entry
+        """
+        params = dict(self.module.params)
+        params.pop("domains")
+        params.update({k: v for k, v in entry.items() if v is not None})
+
+        return params
+
+
+_batch_module = None
+
+
+def _batch_init(module):
+    """
+    """
+    global _batch_module
+    _batch_module = module
+
+
+def _batch_run(params):
+    """
+    """
+    return run_domain(_batch_module, params)
+
+
+def run_domain(module, params):
+    """
+      result of one domain, failures included
+    """
+    domain_module = DomainModule(module, params)
+
+    try:
+        result = SnakeoilOpenssl(domain_module).run()
+    except DomainFailed as e:
+        result = dict(failed=True, changed=False, msg=str(e))
+    except Exception as e:
+        result = dict(failed=True, changed=False, msg=f"{type(e).__name__}: {e}")
+
+    result["domain"] = params.get("domain")
+
+    if domain_module.warnings:
+        result["warnings"] = domain_module.warnings
+
+    return result
+
+
+def execute(module):
+    """
+      single domain or batch, under cProfile with 'profile_directory'
+      (or SNAKEOIL_PROFILE_DIR)
+    """
+    with Profiler(module.params.get("profile_directory"), "snakeoil_openssl") as profiler:
+        if module.params.get("domains"):
+            result = SnakeoilBatch(module).run()
+        else:
+            result = SnakeoilOpenssl(module).run()
+
+    if profiler.files:
+        result["profile"] = profiler.files
+
+    return result
+
+
 # ===========================================
 # Module execution.
 #
 
 
-def main():
+def argument_spec():
     """
+      shared with the action plugin, which validates the task arguments
+      on the controller with the same spec
     """
-    args = dict(
+    return dict(
         state=dict(
             required=True,
-            choose=[
+            choices=[
+                'bundle',
                 'crt',
                 'csr',
-                'dhparam'
-                'dhparam_size'
+                'dhparam',
+                'dhparam_size',
+                'inspect'
+            ]
+        ),
+        backend=dict(
+            default="openssl",
+            choices=[
+                'openssl',
+                'cryptography'
             ]
         ),
         directory=dict(
@@ -204,13 +1165,73 @@ def main():
             type="path"
         ),
         domain=dict(
-            required=True,
+            required=False,
             type="path"
         ),
+        domains=dict(
+            required=False,
+            type="list",
+            elements="dict",
+            options=dict(
+                domain=dict(required=True, type="path"),
+                alt_names=dict(type="list", elements="dict"),
+                san_limit=dict(type="int"),
+                dn=dict(type="dict"),
+                email=dict(type="str"),
+                key_type=dict(choices=['rsa', 'ec', 'ed25519']),
+                key_size=dict(type="int"),
+                cert_life_time=dict(type="int"),
+                dhparam=dict(type="int"),
+                dhparam_mode=dict(choices=['generate', 'ffdhe']),
+            )
+        ),
         dhparam=dict(
             default=2048,
             type="int"
         ),
+        dhparam_mode=dict(
+            default="generate",
+            choices=[
+                'generate',
+                'ffdhe'
+            ]
+        ),
+        dhparam_pool=dict(
+            required=False,
+            type="path"
+        ),
+        dhparam_pool_depth=dict(
+            default=2,
+            type="int"
+        ),
+        dhparam_store=dict(
+            required=False,
+            type="path"
+        ),
+        dhparam_workers=dict(
+            default=0,
+            type="int"
+        ),
+        force=dict(
+            default=False,
+            type="bool"
+        ),
+        renew=dict(
+            default=False,
+            type="bool"
+        ),
+        key_type=dict(
+            default="rsa",
+            choices=[
+                'rsa',
+                'ec',
+                'ed25519'
+            ]
+        ),
+        key_size=dict(
+            required=False,
+            type="int"
+        ),
         cert_life_time=dict(
             default=10,
             type="int"
@@ -219,16 +1240,92 @@ def main():
             required=False,
             type="str"
         ),
+        san_limit=dict(
+            default=0,
+            type="int"
+        ),
+        alt_names=dict(
+            required=False,
+            type="list",
+            elements="dict",
+            default=[]
+        ),
+        dn=dict(
+            required=False,
+            type="dict",
+            default={}
+        ),
+        email=dict(
+            required=False,
+            type="str"
+        ),
+        ca_directory=dict(
+            required=False,
+            type="path"
+        ),
+        ca_common_name=dict(
+            default="snakeoil CA",
+            type="str"
+        ),
+        ca_life_time=dict(
+            default=3650,
+            type="int"
+        ),
+        renew_before=dict(
+            default=10,
+            type="int"
+        ),
+        renew_window=dict(
+            default=0,
+            type="int"
+        ),
+        cache_file=dict(
+            required=False,
+            type="path"
+        ),
+        cache_size=dict(
+            default=1024,
+            type="int"
+        ),
+        worker_socket=dict(
+            required=False,
+            type="path"
+        ),
+        worker_idle_timeout=dict(
+            default=600,
+            type="int"
+        ),
+        timings=dict(
+            default=False,
+            type="bool"
+        ),
+        profile_directory=dict(
+            required=False,
+            type="path"
+        ),
         # openssl_params=dict(required=True, type="path"),
     )
 
+
+def main():
+    """
+    """
+    # interpreter start and module imports
+    startup = startup_usage()
+
+    args = argument_spec()
+
     module = AnsibleModule(
         argument_spec=args,
+        mutually_exclusive=MUTUALLY_EXCLUSIVE,
+        required_one_of=REQUIRED_ONE_OF,
         supports_check_mode=False,
     )
 
-    openssl = SnakeoilOpenssl(module)
-    result = openssl.run()
+    result = execute(module)
+
+    if module.params.get("timings"):
+        result.setdefault("timings", dict())["startup"] = startup
 
     module.log(msg=f"= result : '{result}'")
 
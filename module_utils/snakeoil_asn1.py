@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+# (c) 2021-2023, Bodo Schulz <bodo@boone-schulz.de>
+# Apache-2.0 (see LICENSE or https://opensource.org/license/apache-2-0/)
+# SPDX-License-Identifier: Apache-2.0
+
+# minimal DER reader / writer.
+# only the handful of ASN.1 types we need to look into
+# certificates and DH parameters, without any crypto library.
+
+from __future__ import absolute_import, print_function
+import base64
+import binascii
+
+__metaclass__ = type
+
+INTEGER = 0x02
+BIT_STRING = 0x03
+OCTET_STRING = 0x04
+OID = 0x06
+SEQUENCE = 0x30
+
+
+class ASN1Error(ValueError):
+    """
+    """
+    pass
+
+
+def pem_to_der(data, label=None):
+    """
+      decode the first PEM block (with the given label) into DER bytes
+    """
+    if isinstance(data, str):
+        data = data.encode()
+
+    begin = b"-----BEGIN " + (label.encode() if label else b"")
+    start = data.find(begin)
+
+    if start < 0:
+        raise ASN1Error(f"no PEM block '{label}' found")
+
+    start = data.index(b"\n", start) + 1
+    end = data.find(b"-----END", start)
+
+    if end < 0:
+        raise ASN1Error("unterminated PEM block")
+
+    try:
+        return base64.b64decode(b"".join(data[start:end].split()), validate=True)
+    except binascii.Error as e:
+        raise ASN1Error(f"invalid PEM block: {e}")
+
+
+def pem_label(data):
+    """
+      label of the first PEM block, e.g. 'CERTIFICATE'
+    """
+    if isinstance(data, str):
+        data = data.encode()
+
+    start = data.find(b"-----BEGIN ")
+
+    if start < 0:
+        return None
+
+    start += len(b"-----BEGIN ")
+
+    return data[start:data.find(b"-----", start)].decode()
+
+
+def read_tlv(data, offset=0):
+    """
+      parse one DER element at <offset>.
+      returns (tag, content start, content end)
+    """
+    try:
+        tag = data[offset]
+        length = data[offset + 1]
+        offset += 2
+
+        if length & 0x80:
+            count = length & 0x7f
+            length = int.from_bytes(data[offset:offset + count], "big")
+            offset += count
+    except IndexError:
+        raise ASN1Error("truncated DER element")
+
+    if offset + length > len(data):
+        raise ASN1Error("truncated DER element")
+
+    return tag, offset, offset + length
+
+
+def children(data, start=0, end=None):
+    """
+      iterate over the elements between <start> and <end>,
+      yields (tag, content start, content end)
+    """
+    end = len(data) if end is None else end
+
+    while start < end:
+        tag, content_start, content_end = read_tlv(data, start)
+        yield tag, content_start, content_end
+        start = content_end
+
+
+def read_integer(data, start, end):
+    """
+    """
+    return int.from_bytes(data[start:end], "big", signed=True)
+
+
+def encode_length(length):
+    """
+    """
+    if length < 0x80:
+        return bytes([length])
+
+    raw = length.to_bytes((length.bit_length() + 7) // 8, "big")
+
+    return bytes([0x80 | len(raw)]) + raw
+
+
+def encode_integer(value):
+    """
+    """
+    raw = value.to_bytes(value.bit_length() // 8 + 1, "big", signed=True)
+
+    return bytes([INTEGER]) + encode_length(len(raw)) + raw
+
+
+def encode_sequence(*items):
+    """
+    """
+    content = b"".join(items)
+
+    return bytes([SEQUENCE]) + encode_length(len(content)) + content
+
+
+def der_to_pem(der, label):
+    """
+    """
+    encoded = base64.b64encode(der).decode()
+    lines = [encoded[i:i + 64] for i in range(0, len(encoded), 64)]
+
+    return "\n".join([f"-----BEGIN {label}-----"] + lines + [f"-----END {label}-----", ""]).encode()
+
+
+def read_oid(data, start, end):
+    """
+      dotted string representation of an OBJECT IDENTIFIER
+    """
+    arcs = []
+    value = 0
+
+    for byte in data[start:end]:
+        value = (value << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            arcs.append(value)
+            value = 0
+
+    if not arcs:
+        raise ASN1Error("empty OBJECT IDENTIFIER")
+
+    first = min(arcs[0] // 40, 2)
+
+    return ".".join(str(arc) for arc in [first, arcs[0] - 40 * first] + arcs[1:])
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+# (c) 2021-2023, Bodo Schulz <bodo@boone-schulz.de>
+# Apache-2.0 (see LICENSE or https://opensource.org/license/apache-2-0/)
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import absolute_import, print_function
+import json
+import os
+import tempfile
+from collections import OrderedDict
+
+__metaclass__ = type
+
+
+# files of another version are dropped
+CACHE_VERSION = 2
+
+
+class MetadataCache(object):
+    """
+      parsed facts of certificates and dh parameters, keyed by the sha256
+      of the file content. an entry can never be outdated, the same bytes
+      always give the same facts.
+
+      every consumer ('date', 'inspect', 'dhparam') has its own facts
+      under a digest, the modules never read the facts of each other.
+
+      the cache holds at most <max_entries>, the least recently used
+      entries are dropped first.
+    """
+
+    def __init__(self, file_name, max_entries=1024):
+        """
+        """
+        self.file_name = file_name
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.changed = False
+
+        try:
+            with open(file_name, "r") as f:
+                content = json.load(f)
+
+            if content.get("version") == CACHE_VERSION:
+                # stored from least to most recently used
+                self.entries = OrderedDict(content.get("entries", []))
+        except (IOError, OSError, ValueError, AttributeError, TypeError):
+            self.entries = OrderedDict()
+
+    def get(self, consumer, digest):
+        """
+          facts of <consumer> for <digest>, None on a miss
+        """
+        facts = self.entries.get(digest, {}).get(consumer)
+
+        if facts is not None and next(reversed(self.entries)) != digest:
+            self.entries.move_to_end(digest)
+            self.changed = True
+
+        return facts
+
+    def put(self, consumer, digest, facts):
+        """
+        """
+        self.entries.setdefault(digest, {})[consumer] = facts
+        self.entries.move_to_end(digest)
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+        self.changed = True
+
+    def save(self):
+        """
+          replace the cache atomically, only when something has changed
+        """
+        if not self.changed:
+            return
+
+        directory = os.path.dirname(os.path.abspath(self.file_name))
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_file = tempfile.mkstemp(dir=directory, prefix=".snakeoil_cache.")
+
+        with os.fdopen(fd, "w") as f:
+            json.dump(dict(version=CACHE_VERSION, entries=list(self.entries.items())), f)
+
+        os.replace(tmp_file, self.file_name)
+        self.changed = False
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+# (c) 2021-2023, Bodo Schulz <bodo@boone-schulz.de>
+# Apache-2.0 (see LICENSE or https://opensource.org/license/apache-2-0/)
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import absolute_import, print_function
+import ipaddress
+import re
+
+__metaclass__ = type
+
+_SECTION = re.compile(r"^\[\s*(?P<name>[^\]]+?)\s*\]$")
+_OPTION = re.compile(r"^(?P<key>[^=]+?)\s*=\s*(?P<value>.*)$")
+_LABEL = re.compile(r"^(?!-)[a-z0-9_-]{1,63}(?<!-)$")
+
+
+def read_openssl_config(file_name):
+    """
+      parse a (simple) openssl config, as rendered by templates/csr.j2,
+      into a dictionary of sections.
+      option order is preserved, keys are case sensitive.
+    """
+    sections = dict()
+    current = sections.setdefault("default", [])
+
+    with open(file_name, "r") as f:
+        for line in f:
+            line = line.strip()
+
+            if not line or line.startswith("#") or line.startswith(";"):
+                continue
+
+            section = _SECTION.match(line)
+            if section:
+                current = sections.setdefault(section.group("name"), [])
+                continue
+
+            option = _OPTION.match(line)
+            if option:
+                current.append((option.group("key").strip(), option.group("value").strip()))
+
+    return sections
+
+
+def request_settings(sections):
+    """
+      extract everything we need to build a certificate request
+      from a parsed openssl config.
+
+      returns a dictionary with:
+        - subject   : list of (short name, value)
+        - alt_names : list of (type, value), type is 'DNS' or 'IP'
+        - digest    : message digest name (e.g. 'sha512')
+        - bits      : default key length
+    """
+    req = dict(sections.get("req", []))
+
+    subject = sections.get(req.get("distinguished_name", "dn"), [])
+
+    alt_names = []
+    req_ext = dict(sections.get(req.get("req_extensions", "req_ext"), []))
+    san = req_ext.get("subjectAltName", "")
+
+    if san.startswith("@"):
+        for key, value in sections.get(san[1:], []):
+            alt_names.append((key.split(".")[0].upper(), value))
+    elif san:
+        for entry in san.split(","):
+            key, _, value = entry.strip().partition(":")
+            alt_names.append((key.upper(), value))
+
+    return dict(
+        subject=subject,
+        alt_names=alt_names,
+        digest=req.get("default_md", "sha512"),
+        bits=int(req.get("default_bits", 4096))
+    )
+
+
+def normalize_alt_names(alt_names):
+    """
+      flatten the 'dns' and 'ip' lists of snakeoil_alt_names into
+      a sorted list of unique (type, value) pairs.
+
+      DNS names are stored in their IDNA (xn--) form, IP addresses
+      in their compressed form. an invalid entry raises a ValueError.
+    """
+    dns_names = set()
+    ip_addresses = set()
+
+    for n in alt_names or []:
+        for k in n.get("dns") or []:
+            dns_names.add(_dns_name(k))
+        for k in n.get("ip") or []:
+            ip_addresses.add(_ip_address(k))
+
+    dns = [("DNS", k) for k in sorted(dns_names)]
+    ip = [("IP", str(k)) for k in sorted(ip_addresses, key=lambda a: (a.version, int(a)))]
+
+    return dns + ip
+
+
+def _dns_name(name):
+    """
+    """
+    value = str(name).strip().rstrip(".").lower()
+    prefix = ""
+
+    if value.startswith("*."):
+        prefix, value = "*.", value[2:]
+
+    try:
+        value = value.encode("idna").decode("ascii")
+    except UnicodeError as e:
+        raise ValueError(f"invalid DNS name '{name}': {e}")
+
+    if len(value) > 253 or not all(_LABEL.match(label) for label in value.split(".")):
+        raise ValueError(f"invalid DNS name '{name}'")
+
+    return prefix + value
+
+
+def _ip_address(address):
+    """
+    """
+    try:
+        return ipaddress.ip_address(str(address).strip())
+    except ValueError:
+        raise ValueError(f"invalid IP address '{address}'")
+
+
+def split_alt_names(alt_names, limit):
+    """
+      at most <limit> names per certificate, 0 means no limit
+    """
+    if not limit or len(alt_names) <= limit:
+        return [alt_names]
+
+    return [alt_names[i:i + limit] for i in range(0, len(alt_names), limit)]
+
+
+def render_openssl_config(domain, dn, email, alt_names, bits=4096, digest="sha512"):
+    """
+      python port of templates/csr.j2
+
+      dn       : dictionary with country, state, location and organisation
+      alt_names: list of (type, value), see normalize_alt_names()
+    """
+    dn = dn or dict()
+
+    lines = [
+        "[req]",
+        f"default_bits = {bits}",
+        "prompt = no",
+        f"default_md = {digest}",
+        "req_extensions = req_ext",
+        "distinguished_name = dn",
+        "",
+        "[ dn ]",
+        f"C  = {dn.get('country', 'DE')}",
+        f"ST = {dn.get('state', 'Hamburg')}",
+        f"L  = {dn.get('location', 'Hamburg')}",
+        f"O  = {dn.get('organisation', 'ACME Inc.')}",
+        "OU = Testing Domain",
+        f"CN = *.{domain}",
+        f"emailAddress = {email}",
+        "",
+        "[ req_ext ]",
+        "subjectAltName = @alt_names",
+        "",
+        "[ alt_names ]",
+    ]
+
+    # one counter per type, over all groups
+    index = dict(DNS=0, IP=0)
+
+    for kind, value in alt_names or []:
+        index[kind] += 1
+        lines.append(f"{kind}.{index[kind]:<{6 - len(kind)}} = {value}")
+
+    return "\n".join(lines) + "\n"
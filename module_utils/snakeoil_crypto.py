@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+# (c) 2021-2023, Bodo Schulz <bodo@boone-schulz.de>
+# Apache-2.0 (see LICENSE or https://opensource.org/license/apache-2-0/)
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import absolute_import, print_function
+import datetime
+import ipaddress
+
+__metaclass__ = type
+
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import dh, ec, ed25519, rsa
+    from cryptography.x509.oid import NameOID
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+else:
+    HAS_CRYPTOGRAPHY = True
+
+
+def _name_oids():
+    """
+    """
+    return {
+        "C": NameOID.COUNTRY_NAME,
+        "ST": NameOID.STATE_OR_PROVINCE_NAME,
+        "L": NameOID.LOCALITY_NAME,
+        "O": NameOID.ORGANIZATION_NAME,
+        "OU": NameOID.ORGANIZATIONAL_UNIT_NAME,
+        "CN": NameOID.COMMON_NAME,
+        "emailAddress": NameOID.EMAIL_ADDRESS,
+    }
+
+
+def _curves():
+    """
+    """
+    return {
+        256: ec.SECP256R1,
+        384: ec.SECP384R1,
+        521: ec.SECP521R1,
+    }
+
+
+def _digest(name, key):
+    """
+      Ed25519 signs without a separate message digest
+    """
+    if isinstance(key, ed25519.Ed25519PrivateKey):
+        return None
+
+    return getattr(hashes, name.upper())()
+
+
+def check_key(key_type, key_size):
+    """
+      raise ValueError for a key, which generate_private_key() can not create
+    """
+    if key_type == "ec":
+        if key_size not in _curves():
+            raise ValueError(f"unsupported curve size '{key_size}' (256, 384, 521)")
+    elif key_type == "rsa":
+        if not isinstance(key_size, int) or key_size < 1024:
+            raise ValueError(f"unsupported rsa key size '{key_size}' (at least 1024)")
+    elif key_type != "ed25519":
+        raise ValueError(f"unsupported key type '{key_type}' (rsa, ec, ed25519)")
+
+
+def generate_private_key(key_type="rsa", key_size=4096):
+    """
+      key_size is the modulus length for 'rsa' and the curve size for 'ec'
+      (256, 384, 521), it is ignored for 'ed25519'
+    """
+    check_key(key_type, key_size)
+
+    if key_type == "ec":
+        return ec.generate_private_key(_curves()[key_size]())
+
+    if key_type == "ed25519":
+        return ed25519.Ed25519PrivateKey.generate()
+
+    return rsa.generate_private_key(public_exponent=65537, key_size=key_size)
+
+
+def private_key_pem(key):
+    """
+      unencrypted PKCS#8, the same format 'openssl req -nodes' writes
+    """
+    return key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+
+
+def load_private_key(data):
+    """
+    """
+    return serialization.load_pem_private_key(data, password=None)
+
+
+def load_csr(data):
+    """
+    """
+    return x509.load_pem_x509_csr(data)
+
+
+def load_certificate(data):
+    """
+    """
+    return x509.load_pem_x509_certificate(data)
+
+
+def build_csr(key, subject, alt_names, digest="sha512"):
+    """
+      subject  : list of (short name, value), e.g. [('CN', '*.bar.local')]
+      alt_names: list of (type, value), type is 'DNS' or 'IP'
+    """
+    oids = _name_oids()
+
+    name = x509.Name([
+        x509.NameAttribute(oids[k], v) for k, v in subject if k in oids
+    ])
+
+    builder = x509.CertificateSigningRequestBuilder().subject_name(name)
+
+    san = _general_names(alt_names)
+    if san:
+        builder = builder.add_extension(x509.SubjectAlternativeName(san), critical=False)
+
+    return builder.sign(key, _digest(digest, key))
+
+
+def build_certificate(csr, key, days, digest="sha512", ca_cert=None):
+    """
+      self signed certificate for the given request,
+      comparable to 'openssl x509 -req -signkey <key> -extensions req_ext'.
+      with 'ca_cert', <key> is the key of the CA and the certificate is issued by it.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    builder = (
+        x509.CertificateBuilder()
+        .subject_name(csr.subject)
+        .issuer_name(ca_cert.subject if ca_cert else csr.subject)
+        .public_key(csr.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=days))
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(csr.public_key()), critical=False)
+    )
+
+    if ca_cert:
+        builder = (
+            builder
+            .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
+            .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(ca_cert.public_key()), critical=False)
+        )
+
+    for extension in csr.extensions:
+        builder = builder.add_extension(extension.value, critical=extension.critical)
+
+    return builder.sign(key, _digest(digest, key))
+
+
+def build_ca_certificate(key, common_name, days, digest="sha384"):
+    """
+      self signed root certificate, which may only sign leaf certificates
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+
+    builder = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=days))
+        .add_extension(x509.BasicConstraints(ca=True, path_length=0), critical=True)
+        .add_extension(
+            x509.KeyUsage(
+                digital_signature=False, content_commitment=False, key_encipherment=False,
+                data_encipherment=False, key_agreement=False, key_cert_sign=True,
+                crl_sign=True, encipher_only=False, decipher_only=False
+            ),
+            critical=True
+        )
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+    )
+
+    return builder.sign(key, _digest(digest, key))
+
+
+def certificate_pem(cert):
+    """
+    """
+    return cert.public_bytes(serialization.Encoding.PEM)
+
+
+def certificate_dates(data):
+    """
+      (notBefore, notAfter) of a PEM encoded certificate as UTC datetimes
+    """
+    cert = x509.load_pem_x509_certificate(data)
+
+    # the *_utc properties exist since cryptography 42
+    if hasattr(cert, "not_valid_after_utc"):
+        return cert.not_valid_before_utc, cert.not_valid_after_utc
+
+    return (
+        cert.not_valid_before.replace(tzinfo=datetime.timezone.utc),
+        cert.not_valid_after.replace(tzinfo=datetime.timezone.utc)
+    )
+
+
+def csr_pem(csr):
+    """
+    """
+    return csr.public_bytes(serialization.Encoding.PEM)
+
+
+def generate_dhparam(bits, generator=5):
+    """
+    """
+    parameters = dh.generate_parameters(generator=generator, key_size=bits)
+
+    return parameters.parameter_bytes(
+        serialization.Encoding.PEM,
+        serialization.ParameterFormat.PKCS3
+    )
+
+
+def _general_names(alt_names):
+    """
+    """
+    result = []
+
+    for kind, value in alt_names:
+        if kind == "DNS":
+            result.append(x509.DNSName(value))
+        elif kind == "IP":
+            result.append(x509.IPAddress(ipaddress.ip_address(value)))
+
+    return result
@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+
+# (c) 2021-2023, Bodo Schulz <bodo@boone-schulz.de>
+# Apache-2.0 (see LICENSE or https://opensource.org/license/apache-2-0/)
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import absolute_import, print_function
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from ansible.module_utils.snakeoil_asn1 import (
+    INTEGER, SEQUENCE, children, der_to_pem, encode_integer, encode_sequence, pem_to_der, read_integer, read_tlv
+)
+from ansible.module_utils.snakeoil_timing import Child
+
+__metaclass__ = type
+
+# generate one set of parameters with python cryptography,
+# used for the refill when no openssl binary is available
+_REFILL_SCRIPT = """
+import os
+import sys
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import dh
+
+tmp_file, pool_file, bits = sys.argv[1], sys.argv[2], int(sys.argv[3])
+
+data = dh.generate_parameters(generator=5, key_size=bits).parameter_bytes(
+    serialization.Encoding.PEM, serialization.ParameterFormat.PKCS3)
+
+with open(tmp_file, "wb") as f:
+    f.write(data)
+
+os.rename(tmp_file, pool_file)
+"""
+
+# generate one set of parameters with the openssl binary
+_REFILL_SHELL = '"$4" dhparam -5 -out "$1" "$3" > /dev/null 2>&1 && mv "$1" "$2" || rm -f "$1"'
+
+
+# RFC 7919 (appendix A) finite field groups, generator 2
+FFDHE_GROUPS = {
+    2048: int(
+        "FFFFFFFFFFFFFFFFADF85458A2BB4A9AAFDC5620273D3CF1D8B9C583CE2D3695A9E13641146433FBCC939DCE249B3EF97D2FE363630C75D8F681B202AEC4617A"
+        "D3DF1ED5D5FD65612433F51F5F066ED0856365553DED1AF3B557135E7F57C935984F0C70E0E68B77E2A689DAF3EFE8721DF158A136ADE73530ACCA4F483A797A"
+        "BC0AB182B324FB61D108A94BB2C8E3FBB96ADAB760D7F4681D4F42A3DE394DF4AE56EDE76372BB190B07A7C8EE0A6D709E02FCE1CDF7E2ECC03404CD28342F61"
+        "9172FE9CE98583FF8E4F1232EEF28183C3FE3B1B4C6FAD733BB5FCBC2EC22005C58EF1837D1683B2C6F34A26C1B2EFFA886B423861285C97FFFFFFFFFFFFFFFF",
+        16),
+    3072: int(
+        "FFFFFFFFFFFFFFFFADF85458A2BB4A9AAFDC5620273D3CF1D8B9C583CE2D3695A9E13641146433FBCC939DCE249B3EF97D2FE363630C75D8F681B202AEC4617A"
+        "D3DF1ED5D5FD65612433F51F5F066ED0856365553DED1AF3B557135E7F57C935984F0C70E0E68B77E2A689DAF3EFE8721DF158A136ADE73530ACCA4F483A797A"
+        "BC0AB182B324FB61D108A94BB2C8E3FBB96ADAB760D7F4681D4F42A3DE394DF4AE56EDE76372BB190B07A7C8EE0A6D709E02FCE1CDF7E2ECC03404CD28342F61"
+        "9172FE9CE98583FF8E4F1232EEF28183C3FE3B1B4C6FAD733BB5FCBC2EC22005C58EF1837D1683B2C6F34A26C1B2EFFA886B4238611FCFDCDE355B3B6519035B"
+        "BC34F4DEF99C023861B46FC9D6E6C9077AD91D2691F7F7EE598CB0FAC186D91CAEFE130985139270B4130C93BC437944F4FD4452E2D74DD364F2E21E71F54BFF"
+        "5CAE82AB9C9DF69EE86D2BC522363A0DABC521979B0DEADA1DBF9A42D5C4484E0ABCD06BFA53DDEF3C1B20EE3FD59D7C25E41D2B66C62E37FFFFFFFFFFFFFFFF",
+        16),
+    4096: int(
+        "FFFFFFFFFFFFFFFFADF85458A2BB4A9AAFDC5620273D3CF1D8B9C583CE2D3695A9E13641146433FBCC939DCE249B3EF97D2FE363630C75D8F681B202AEC4617A"
+        "D3DF1ED5D5FD65612433F51F5F066ED0856365553DED1AF3B557135E7F57C935984F0C70E0E68B77E2A689DAF3EFE8721DF158A136ADE73530ACCA4F483A797A"
+        "BC0AB182B324FB61D108A94BB2C8E3FBB96ADAB760D7F4681D4F42A3DE394DF4AE56EDE76372BB190B07A7C8EE0A6D709E02FCE1CDF7E2ECC03404CD28342F61"
+        "9172FE9CE98583FF8E4F1232EEF28183C3FE3B1B4C6FAD733BB5FCBC2EC22005C58EF1837D1683B2C6F34A26C1B2EFFA886B4238611FCFDCDE355B3B6519035B"
+        "BC34F4DEF99C023861B46FC9D6E6C9077AD91D2691F7F7EE598CB0FAC186D91CAEFE130985139270B4130C93BC437944F4FD4452E2D74DD364F2E21E71F54BFF"
+        "5CAE82AB9C9DF69EE86D2BC522363A0DABC521979B0DEADA1DBF9A42D5C4484E0ABCD06BFA53DDEF3C1B20EE3FD59D7C25E41D2B669E1EF16E6F52C3164DF4FB"
+        "7930E9E4E58857B6AC7D5F42D69F6D187763CF1D5503400487F55BA57E31CC7A7135C886EFB4318AED6A1E012D9E6832A907600A918130C46DC778F971AD0038"
+        "092999A333CB8B7A1A1DB93D7140003C2A4ECEA9F98D0ACC0A8291CDCEC97DCF8EC9B55A7F88A46B4DB5A851F44182E1C68A007E5E655F6AFFFFFFFFFFFFFFFF",
+        16),
+    6144: int(
+        "FFFFFFFFFFFFFFFFADF85458A2BB4A9AAFDC5620273D3CF1D8B9C583CE2D3695A9E13641146433FBCC939DCE249B3EF97D2FE363630C75D8F681B202AEC4617A"
+        "D3DF1ED5D5FD65612433F51F5F066ED0856365553DED1AF3B557135E7F57C935984F0C70E0E68B77E2A689DAF3EFE8721DF158A136ADE73530ACCA4F483A797A"
+        "BC0AB182B324FB61D108A94BB2C8E3FBB96ADAB760D7F4681D4F42A3DE394DF4AE56EDE76372BB190B07A7C8EE0A6D709E02FCE1CDF7E2ECC03404CD28342F61"
+        "9172FE9CE98583FF8E4F1232EEF28183C3FE3B1B4C6FAD733BB5FCBC2EC22005C58EF1837D1683B2C6F34A26C1B2EFFA886B4238611FCFDCDE355B3B6519035B"
+        "BC34F4DEF99C023861B46FC9D6E6C9077AD91D2691F7F7EE598CB0FAC186D91CAEFE130985139270B4130C93BC437944F4FD4452E2D74DD364F2E21E71F54BFF"
+        "5CAE82AB9C9DF69EE86D2BC522363A0DABC521979B0DEADA1DBF9A42D5C4484E0ABCD06BFA53DDEF3C1B20EE3FD59D7C25E41D2B669E1EF16E6F52C3164DF4FB"
+        "7930E9E4E58857B6AC7D5F42D69F6D187763CF1D5503400487F55BA57E31CC7A7135C886EFB4318AED6A1E012D9E6832A907600A918130C46DC778F971AD0038"
+        "092999A333CB8B7A1A1DB93D7140003C2A4ECEA9F98D0ACC0A8291CDCEC97DCF8EC9B55A7F88A46B4DB5A851F44182E1C68A007E5E0DD9020BFD64B645036C7A"
+        "4E677D2C38532A3A23BA4442CAF53EA63BB454329B7624C8917BDD64B1C0FD4CB38E8C334C701C3ACDAD0657FCCFEC719B1F5C3E4E46041F388147FB4CFDB477"
+        "A52471F7A9A96910B855322EDB6340D8A00EF092350511E30ABEC1FFF9E3A26E7FB29F8C183023C3587E38DA0077D9B4763E4E4B94B2BBC194C6651E77CAF992"
+        "EEAAC0232A281BF6B3A739C1226116820AE8DB5847A67CBEF9C9091B462D538CD72B03746AE77F5E62292C311562A846505DC82DB854338AE49F5235C95B9117"
+        "8CCF2DD5CACEF403EC9D1810C6272B045B3B71F9DC6B80D63FDD4A8E9ADB1E6962A69526D43161C1A41D570D7938DAD4A40E329CD0E40E65FFFFFFFFFFFFFFFF",
+        16),
+    8192: int(
+        "FFFFFFFFFFFFFFFFADF85458A2BB4A9AAFDC5620273D3CF1D8B9C583CE2D3695A9E13641146433FBCC939DCE249B3EF97D2FE363630C75D8F681B202AEC4617A"
+        "D3DF1ED5D5FD65612433F51F5F066ED0856365553DED1AF3B557135E7F57C935984F0C70E0E68B77E2A689DAF3EFE8721DF158A136ADE73530ACCA4F483A797A"
+        "BC0AB182B324FB61D108A94BB2C8E3FBB96ADAB760D7F4681D4F42A3DE394DF4AE56EDE76372BB190B07A7C8EE0A6D709E02FCE1CDF7E2ECC03404CD28342F61"
+        "9172FE9CE98583FF8E4F1232EEF28183C3FE3B1B4C6FAD733BB5FCBC2EC22005C58EF1837D1683B2C6F34A26C1B2EFFA886B4238611FCFDCDE355B3B6519035B"
+        "BC34F4DEF99C023861B46FC9D6E6C9077AD91D2691F7F7EE598CB0FAC186D91CAEFE130985139270B4130C93BC437944F4FD4452E2D74DD364F2E21E71F54BFF"
+        "5CAE82AB9C9DF69EE86D2BC522363A0DABC521979B0DEADA1DBF9A42D5C4484E0ABCD06BFA53DDEF3C1B20EE3FD59D7C25E41D2B669E1EF16E6F52C3164DF4FB"
+        "7930E9E4E58857B6AC7D5F42D69F6D187763CF1D5503400487F55BA57E31CC7A7135C886EFB4318AED6A1E012D9E6832A907600A918130C46DC778F971AD0038"
+        "092999A333CB8B7A1A1DB93D7140003C2A4ECEA9F98D0ACC0A8291CDCEC97DCF8EC9B55A7F88A46B4DB5A851F44182E1C68A007E5E0DD9020BFD64B645036C7A"
+        "4E677D2C38532A3A23BA4442CAF53EA63BB454329B7624C8917BDD64B1C0FD4CB38E8C334C701C3ACDAD0657FCCFEC719B1F5C3E4E46041F388147FB4CFDB477"
+        "A52471F7A9A96910B855322EDB6340D8A00EF092350511E30ABEC1FFF9E3A26E7FB29F8C183023C3587E38DA0077D9B4763E4E4B94B2BBC194C6651E77CAF992"
+        "EEAAC0232A281BF6B3A739C1226116820AE8DB5847A67CBEF9C9091B462D538CD72B03746AE77F5E62292C311562A846505DC82DB854338AE49F5235C95B9117"
+        "8CCF2DD5CACEF403EC9D1810C6272B045B3B71F9DC6B80D63FDD4A8E9ADB1E6962A69526D43161C1A41D570D7938DAD4A40E329CCFF46AAA36AD004CF600C838"
+        "1E425A31D951AE64FDB23FCEC9509D43687FEB69EDD1CC5E0B8CC3BDF64B10EF86B63142A3AB8829555B2F747C932665CB2C0F1CC01BD70229388839D2AF05E4"
+        "54504AC78B7582822846C0BA35C35F5C59160CC046FD8251541FC68C9C86B022BB7099876A460E7451A8A93109703FEE1C217E6C3826E52C51AA691E0E423CFC"
+        "99E9E31650C1217B624816CDAD9A95F9D5B8019488D9C0A0A1FE3075A577E23183F81D4A3F2FA4571EFC8CE0BA8A4FE8B6855DFE72B0A66EDED2FBABFBE58A30"
+        "FAFABE1C5D71A87E2F741EF8C1FE86FEA6BBFDE530677F0D97D11D49F7A8443D0822E506A9F4614E011E2A94838FF88CD68C8BB7C5C6424CFFFFFFFFFFFFFFFF",
+        16),
+}
+
+
+def ffdhe_group(bits):
+    """
+      smallest RFC 7919 group with at least <bits>,
+      returns (bit size, PEM encoded DH PARAMETERS) or None
+    """
+    for size in sorted(FFDHE_GROUPS):
+        if size >= bits:
+            der = encode_sequence(encode_integer(FFDHE_GROUPS[size]), encode_integer(2))
+            return size, der_to_pem(der, "DH PARAMETERS")
+
+    return None
+
+
+def dhparam_info(data):
+    """
+      size (and RFC 7919 group name, if any) of PEM encoded DH parameters,
+      read without openssl or a crypto library
+    """
+    der = pem_to_der(data, "DH PARAMETERS")
+
+    tag, start, end = read_tlv(der)
+    if tag != SEQUENCE:
+        raise ValueError("DH PARAMETERS is not a sequence")
+
+    values = [read_integer(der, s, e) for t, s, e in children(der, start, end) if t == INTEGER]
+    if len(values) < 2:
+        raise ValueError("DH PARAMETERS without prime and generator")
+
+    prime, generator = values[0], values[1]
+
+    group = None
+    size = prime.bit_length()
+
+    if generator == 2 and FFDHE_GROUPS.get(size) == prime:
+        group = f"ffdhe{size}"
+
+    return dict(
+        size=size,
+        group=group
+    )
+
+
+class DHParamPool(object):
+    """
+      pool of pre-generated DH parameters, one sub directory per bit size:
+
+        <directory>/<bits>/<id>.pem    ready to use
+        <directory>/<bits>/.<id>.tmp   currently generated by a refill worker
+
+      entries are handed out with an atomic rename, so concurrent runs
+      never get the same parameters.
+    """
+
+    # a refill worker that takes longer than this is considered dead
+    stale_after = 24 * 60 * 60
+
+    def __init__(self, directory, openssl_bin=None):
+        """
+        """
+        self.directory = directory
+        self.openssl_bin = openssl_bin
+
+    def take(self, bits, dest):
+        """
+          move one ready entry for <bits> to <dest>.
+          returns False, when the pool is empty.
+        """
+        pool = self._pool_directory(bits)
+        claimed = os.path.join(pool, f".claimed-{os.getpid()}-{uuid.uuid4().hex}")
+
+        for entry in os.scandir(pool):
+            if entry.name.startswith(".") or not entry.name.endswith(".pem"):
+                continue
+            try:
+                os.rename(entry.path, claimed)
+            except FileNotFoundError:
+                # somebody else was faster
+                continue
+
+            shutil.move(claimed, dest)
+            return True
+
+        return False
+
+    def refill(self, bits, depth):
+        """
+          start detached workers until ready and pending entries reach <depth>.
+          returns the number of started workers.
+        """
+        pool = self._pool_directory(bits)
+        started = 0
+
+        with open(os.path.join(pool, ".refill.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            available = 0
+            now = time.time()
+
+            for entry in os.scandir(pool):
+                if entry.name.endswith(".pem") and not entry.name.startswith("."):
+                    available += 1
+                elif entry.name.endswith(".tmp"):
+                    if now - entry.stat().st_mtime > self.stale_after:
+                        self._remove(entry.path)
+                    else:
+                        available += 1
+
+            for _ in range(depth - available):
+                self._spawn(pool, bits)
+                started += 1
+
+        return started
+
+    def _spawn(self, pool, bits):
+        """
+        """
+        name = uuid.uuid4().hex
+        tmp_file = os.path.join(pool, f".{name}.tmp")
+        pool_file = os.path.join(pool, f"{name}.pem")
+
+        # reserve the slot before the worker starts, so that parallel refills count it
+        open(tmp_file, "w").close()
+
+        if self.openssl_bin:
+            args = ["/bin/sh", "-c", _REFILL_SHELL, "sh", tmp_file, pool_file, str(bits), self.openssl_bin]
+        else:
+            args = [sys.executable, "-c", _REFILL_SCRIPT, tmp_file, pool_file, str(bits)]
+
+        subprocess.Popen(
+            args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            close_fds=True,
+            start_new_session=True
+        )
+
+    def _pool_directory(self, bits):
+        """
+        """
+        pool = os.path.join(self.directory, str(bits))
+        os.makedirs(pool, mode=0o700, exist_ok=True)
+
+        return pool
+
+    def _remove(self, file_name):
+        """
+        """
+        try:
+            os.remove(file_name)
+        except FileNotFoundError:
+            pass
+
+
+class DHParamStore(object):
+    """
+      DH parameters shared by all domains, one set per bit size:
+
+        <directory>/<bits>/<sha256>.pem   the parameters, named by their content
+        <directory>/index.json            sha256 -> size and group of every entry
+
+      the dh.pem of a domain is a hardlink to the entry (or a copy, when
+      the domain directory is on another filesystem).
+    """
+
+    def __init__(self, directory):
+        """
+        """
+        self.directory = directory
+        self.index_file = os.path.join(directory, "index.json")
+
+    def lock(self, bits):
+        """
+          exclusive lock for <bits>, parallel runs must not generate
+          the same size twice. closing the file releases the lock.
+        """
+        lock = open(os.path.join(self._store_directory(bits), ".lock"), "w")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        return lock
+
+    def entry(self, bits):
+        """
+          the stored parameters for <bits>, None if there are none
+        """
+        store = self._store_directory(bits)
+
+        entries = sorted(e.name for e in os.scandir(store) if e.name.endswith(".pem") and not e.name.startswith("."))
+
+        return os.path.join(store, entries[0]) if entries else None
+
+    def link(self, bits, dest):
+        """
+          point <dest> to the stored parameters for <bits>.
+          returns False, when the store has none.
+        """
+        entry = self.entry(bits)
+
+        if not entry:
+            return False
+
+        if os.path.isfile(dest) and os.path.samefile(entry, dest):
+            return True
+
+        tmp_file = os.path.join(os.path.dirname(os.path.abspath(dest)), f".dh-{uuid.uuid4().hex}.tmp")
+
+        try:
+            os.link(entry, tmp_file)
+        except OSError:
+            shutil.copyfile(entry, tmp_file)
+            os.chmod(tmp_file, 0o644)
+
+        os.replace(tmp_file, dest)
+
+        return True
+
+    def add(self, file_name):
+        """
+          put the parameters in <file_name> into the store (if there are
+          none of this size yet) and link <file_name> to the entry.
+          the caller holds the lock for this size.
+        """
+        with open(file_name, "rb") as f:
+            data = f.read()
+
+        info = dhparam_info(data)
+        size = info.get("size")
+
+        if not self.entry(size):
+            digest = hashlib.sha256(data).hexdigest()
+            entry = os.path.join(self._store_directory(size), f"{digest}.pem")
+            tmp_file = os.path.join(self._store_directory(size), f".{digest}.tmp")
+
+            with open(tmp_file, "wb") as f:
+                f.write(data)
+
+            os.chmod(tmp_file, 0o644)
+            os.replace(tmp_file, entry)
+
+            self._update_index(digest, info)
+
+        self.link(size, file_name)
+
+    def info(self, digest):
+        """
+          size and group of a stored entry, None for unknown parameters
+        """
+        try:
+            with open(self.index_file, "r") as f:
+                return json.load(f).get(digest)
+        except (IOError, OSError, ValueError, AttributeError):
+            return None
+
+    def _update_index(self, digest, info):
+        """
+        """
+        with open(os.path.join(self.directory, ".index.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            try:
+                with open(self.index_file, "r") as f:
+                    index = json.load(f)
+            except (IOError, OSError, ValueError):
+                index = dict()
+
+            index[digest] = info
+
+            fd, tmp_file = tempfile.mkstemp(dir=self.directory, prefix=".index.")
+
+            with os.fdopen(fd, "w") as f:
+                json.dump(index, f, indent=2, sort_keys=True)
+
+            os.replace(tmp_file, self.index_file)
+
+    def _store_directory(self, bits):
+        """
+        """
+        store = os.path.join(self.directory, str(bits))
+        os.makedirs(store, mode=0o755, exist_ok=True)
+
+        return store
+
+
+def generate_parallel(bits, dest, workers, openssl_bin=None, max_rss=None):
+    """
+      start <workers> independent generations and keep the first result.
+      the run time of a safe prime search varies a lot, the fastest of
+      several searches is much faster than a single one on average.
+      the peak rss of every worker is added to <max_rss>.
+
+      returns False, when no worker succeeded.
+    """
+    directory = os.path.dirname(os.path.abspath(dest))
+    name = uuid.uuid4().hex
+    candidates = []
+
+    for i in range(max(workers, 1)):
+        tmp_file = os.path.join(directory, f".dh-{name}-{i}.tmp")
+        result_file = os.path.join(directory, f".dh-{name}-{i}.pem")
+
+        if openssl_bin:
+            args = [openssl_bin, "dhparam", "-5", "-out", result_file, str(bits)]
+        else:
+            args = [sys.executable, "-c", _REFILL_SCRIPT, tmp_file, result_file, str(bits)]
+
+        process = subprocess.Popen(
+            args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            close_fds=True
+        )
+        candidates.append((Child(process), tmp_file, result_file))
+
+    winner = None
+    running = list(candidates)
+
+    try:
+        while winner is None and running:
+            for candidate in list(running):
+                child, tmp_file, result_file = candidate
+
+                if child.poll():
+                    running.remove(candidate)
+                    _count(child, max_rss)
+
+                    if child.returncode == 0 and os.path.isfile(result_file):
+                        winner = result_file
+                        break
+
+            if winner is None and running:
+                time.sleep(0.05)
+    finally:
+        for child, tmp_file, result_file in running:
+            child.process.kill()
+            child.wait()
+            _count(child, max_rss)
+
+        for child, tmp_file, result_file in candidates:
+            for file_name in (tmp_file, result_file):
+                if file_name != winner and os.path.exists(file_name):
+                    os.remove(file_name)
+
+    if winner is None:
+        return False
+
+    os.replace(winner, dest)
+
+    return True
+
+
+def _count(child, max_rss):
+    """
+    """
+    if max_rss is not None:
+        max_rss.append(child.max_rss_kb)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+# (c) 2021-2023, Bodo Schulz <bodo@boone-schulz.de>
+# Apache-2.0 (see LICENSE or https://opensource.org/license/apache-2-0/)
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import absolute_import, print_function
+import contextlib
+import fcntl
+import os
+
+__metaclass__ = type
+
+
+def domain_lock(directory, domain, shared=False):
+    """
+      flock on '<directory>/.locks/<domain>.lock'.
+
+      runs, which create artifacts of a domain, hold it exclusive, so only
+      one of them does the work and the others wait and find the result.
+      readers hold it shared and never see a half finished bundle.
+      closing the returned file releases the lock.
+
+      a reader, which may not create the lock file (e.g. a user with
+      read-only access to <directory>), uses an existing one read-only
+      or reads without a lock.
+    """
+    locks = os.path.join(directory, ".locks")
+    lock_file = os.path.join(locks, f"{domain}.lock")
+
+    try:
+        os.makedirs(locks, mode=0o700, exist_ok=True)
+        lock = open(lock_file, "a")
+    except OSError:
+        if not shared:
+            raise
+
+        try:
+            lock = open(lock_file, "r")
+        except OSError:
+            return contextlib.nullcontext()
+
+    fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+    return lock
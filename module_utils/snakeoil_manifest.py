@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+# (c) 2021-2023, Bodo Schulz <bodo@boone-schulz.de>
+# Apache-2.0 (see LICENSE or https://opensource.org/license/apache-2-0/)
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import absolute_import, print_function
+import hashlib
+import json
+import os
+import tempfile
+
+__metaclass__ = type
+
+
+def file_digest(file_name):
+    """
+      sha256 of a file, None if it does not exist
+    """
+    try:
+        with open(file_name, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def inputs_digest(*values):
+    """
+      stable hash over everything an artifact is built from
+    """
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Manifest(object):
+    """
+      remembers, per artifact, the hash of its inputs and the sha256
+      of the file that was created from them.
+
+      an artifact is current, when the inputs are unchanged and the
+      file on disk is still the one we wrote.
+
+      'generation' describes the last run, which created artifacts
+      (unix time, duration in seconds and the artifacts).
+    """
+
+    def __init__(self, file_name):
+        """
+        """
+        self.file_name = file_name
+        self.entries = dict()
+        self.generation = None
+
+        try:
+            with open(file_name, "r") as f:
+                data = json.load(f)
+
+            self.entries = data.get("artifacts", {})
+            self.generation = data.get("generation")
+        except (IOError, OSError, ValueError, AttributeError):
+            self.entries = dict()
+
+    def has(self, name):
+        """
+        """
+        return name in self.entries
+
+    def sha256(self, name):
+        """
+        """
+        return self.entries.get(name, {}).get("sha256")
+
+    def is_current(self, name, inputs, file_name):
+        """
+        """
+        entry = self.entries.get(name)
+
+        if not entry or entry.get("inputs") != inputs:
+            return False
+
+        return entry.get("sha256") == file_digest(file_name)
+
+    def update(self, name, inputs, file_name):
+        """
+        """
+        self.entries[name] = dict(
+            inputs=inputs,
+            sha256=file_digest(file_name)
+        )
+
+    def remove(self, name):
+        """
+        """
+        self.entries.pop(name, None)
+
+    def save(self):
+        """
+          replace the manifest atomically
+        """
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(self.file_name), prefix=".snakeoil_manifest.")
+
+        data = dict(artifacts=self.entries)
+
+        if self.generation:
+            data["generation"] = self.generation
+
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+        os.replace(tmp_file, self.file_name)
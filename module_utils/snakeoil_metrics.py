@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+# (c) 2021-2023, Bodo Schulz <bodo@boone-schulz.de>
+# Apache-2.0 (see LICENSE or https://opensource.org/license/apache-2-0/)
+# SPDX-License-Identifier: Apache-2.0
+
+# prometheus metrics for the node_exporter textfile collector
+
+from __future__ import absolute_import, print_function
+import os
+import tempfile
+
+__metaclass__ = type
+
+# name, type, help and the key of the domain values
+METRICS = [
+    ("snakeoil_certificate_not_after_timestamp_seconds", "gauge", "end of validity of the certificate (unix time)", "not_after"),
+    ("snakeoil_certificate_expiry_days", "gauge", "days until the certificate expires", "diff_days"),
+    ("snakeoil_certificate_renew_now", "gauge", "1 if the renewal date of the certificate is reached", "renew_now"),
+    ("snakeoil_certificate_key_bits", "gauge", "size of the certificate key in bits", "key_size"),
+    ("snakeoil_dhparam_bits", "gauge", "size of the diffie-hellman parameters in bits", "dhparam_size"),
+    ("snakeoil_generation_timestamp_seconds", "gauge", "time of the last run, which created files (unix time)", "generation_time"),
+    ("snakeoil_generation_duration_seconds", "gauge", "duration of the last run, which created files", "generation_duration"),
+]
+
+
+def render_metrics(domains):
+    """
+      domains: dictionary of domain -> values (see METRICS),
+      'key_type' becomes a label of the key metric.
+      missing values are left out.
+    """
+    lines = []
+
+    for name, kind, description, key in METRICS:
+        samples = []
+
+        for domain in sorted(domains):
+            values = domains.get(domain)
+            value = values.get(key)
+
+            if value is None:
+                continue
+
+            labels = dict(domain=domain)
+            if key == "key_size" and values.get("key_type"):
+                labels["key_type"] = values.get("key_type")
+
+            samples.append(f"{name}{{{_labels(labels)}}} {_value(value)}")
+
+        if samples:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines += samples
+
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(file_name, text):
+    """
+      replace <file_name> atomically, the collector must never read a partial file.
+      returns False, when the content is unchanged.
+    """
+    try:
+        with open(file_name, "r") as f:
+            if f.read() == text:
+                return False
+    except (IOError, OSError):
+        pass
+
+    directory = os.path.dirname(os.path.abspath(file_name))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_file = tempfile.mkstemp(dir=directory, prefix=".snakeoil_metrics.")
+
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+
+    # the node_exporter usually runs as another user
+    os.chmod(tmp_file, 0o644)
+    os.replace(tmp_file, file_name)
+
+    return True
+
+
+def _labels(labels):
+    """
+    """
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items()))
+
+
+def _escape(value):
+    """
+    """
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _value(value):
+    """
+    """
+    if isinstance(value, bool):
+        return "1" if value else "0"
+
+    return repr(value) if isinstance(value, float) else str(value)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+# (c) 2021-2023, Bodo Schulz <bodo@boone-schulz.de>
+# Apache-2.0 (see LICENSE or https://opensource.org/license/apache-2-0/)
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import absolute_import, print_function
+import cProfile
+import os
+import pstats
+import time
+from collections import Counter, defaultdict
+
+__metaclass__ = type
+
+# used, when the task does not set a directory
+PROFILE_ENV = "SNAKEOIL_PROFILE_DIR"
+
+# stop following a call path below this time (seconds) or depth
+_MIN_TIME = 0.00001
+_MAX_DEPTH = 64
+
+
+class Profiler(object):
+    """
+      run a block under cProfile and write
+
+        <directory>/<name>-<time>-<pid>.pstats   for pstats, snakeviz, gprof2dot ...
+        <directory>/<name>-<time>-<pid>.folded   collapsed stacks for flamegraph.pl, speedscope ...
+
+      without a directory (and without SNAKEOIL_PROFILE_DIR) it does nothing.
+    """
+
+    def __init__(self, directory, name):
+        """
+        """
+        self.directory = directory or os.environ.get(PROFILE_ENV)
+        self.name = name
+        self.profile = None
+        self.files = []
+
+    def __enter__(self):
+        """
+        """
+        if self.directory:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+          the profile is written, even when the block failed
+        """
+        if not self.profile:
+            return False
+
+        self.profile.disable()
+
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+
+        base_name = os.path.join(self.directory, f"{self.name}-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}")
+
+        self.profile.dump_stats(f"{base_name}.pstats")
+
+        with open(f"{base_name}.folded", "w") as f:
+            for stack, micro_seconds in sorted(folded_stacks(pstats.Stats(self.profile).stats).items()):
+                f.write(f"{stack} {micro_seconds}\n")
+
+        self.files = [f"{base_name}.pstats", f"{base_name}.folded"]
+
+        return False
+
+
+def folded_stacks(stats):
+    """
+      collapsed stacks ('root;caller;callee <microseconds>') from pstats data.
+
+      cProfile only records caller -> callee edges, the time of a function
+      is split between its call paths in the ratio of the edge times.
+    """
+    callees = defaultdict(dict)
+
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge
+
+    result = Counter()
+
+    def walk(func, stack, share):
+        cc, nc, tt, ct, callers = stats[func]
+        stack = stack + [_label(func)]
+
+        own = round(tt * share * 1000000)
+        if own > 0:
+            result[";".join(stack)] += own
+
+        if len(stack) >= _MAX_DEPTH:
+            return
+
+        for callee, edge in callees[func].items():
+            callee_time = stats[callee][3]
+            edge_time = edge[3] * share
+
+            # recursion is folded into the first call
+            if edge_time < _MIN_TIME or not callee_time or _label(callee) in stack:
+                continue
+
+            walk(callee, stack, edge_time / callee_time)
+
+    for func, values in stats.items():
+        if not values[4]:
+            walk(func, [], 1.0)
+
+    return result
+
+
+def _label(func):
+    """
+    """
+    file_name, line, name = func
+
+    if file_name == "~":
+        # built-in
+        label = name
+    else:
+        label = f"{name} ({os.path.basename(file_name)}:{line})"
+
+    # ';' separates the frames of a stack
+    return label.replace(";", ",")
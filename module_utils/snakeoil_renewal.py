@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+# (c) 2021-2023, Bodo Schulz <bodo@boone-schulz.de>
+# Apache-2.0 (see LICENSE or https://opensource.org/license/apache-2-0/)
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import absolute_import, print_function
+import hashlib
+from datetime import timedelta
+
+__metaclass__ = type
+
+
+def renewal_date(domain, not_after, renew_before, renew_window, not_before=None):
+    """
+      'renew_before' days before the certificate expires, moved up to
+      'renew_window' days earlier by an offset taken from the domain name.
+      the offset is stable between runs and spreads certificates, which
+      were created on the same day, over the window.
+
+      with <not_before>, the renewal never moves before the middle of the
+      validity period. a certificate, which lives shorter than
+      renew_before + renew_window days, is not due right after it was issued.
+    """
+    lead = renew_before * 24 * 60 * 60
+    window = renew_window * 24 * 60 * 60
+
+    if not_before is not None:
+        half = (not_after - not_before).total_seconds() // 2
+        lead = min(lead, half)
+        window = min(window, half - lead)
+
+    offset = 0
+
+    if window > 0:
+        offset = int(hashlib.sha256(domain.encode()).hexdigest(), 16) % int(window)
+
+    return not_after - timedelta(seconds=lead + offset)
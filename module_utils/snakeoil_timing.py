@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+# (c) 2021-2023, Bodo Schulz <bodo@boone-schulz.de>
+# Apache-2.0 (see LICENSE or https://opensource.org/license/apache-2-0/)
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import absolute_import, print_function
+import contextlib
+import os
+import resource
+import subprocess
+import tempfile
+import time
+
+__metaclass__ = type
+
+
+def startup_usage():
+    """
+      cpu time the process has used so far and its peak rss,
+      at the start of main() this is the interpreter start and the module import
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    return dict(
+        cpu=round(usage.ru_utime + usage.ru_stime, 6),
+        max_rss_kb=usage.ru_maxrss
+    )
+
+
+def run_command(args):
+    """
+      run <args> like module.run_command, but keep the pid for the peak rss
+      of this call. the output goes through temporary files, a pipe could
+      block the child, while it is not read.
+
+      returns (rc, stdout, stderr, max_rss_kb)
+    """
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        child = Child(subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=out, stderr=err, close_fds=True))
+        child.wait()
+
+        out.seek(0)
+        err.seek(0)
+
+        return child.returncode, out.read().decode(errors="replace"), err.read().decode(errors="replace"), child.max_rss_kb
+
+
+class Child(object):
+    """
+      a started subprocess, reaped with os.wait4.
+
+      ru_maxrss of the child is of no use: linux keeps the high-water mark
+      across exec, so it includes the module process the child was forked
+      from. the peak rss is sampled from VmHWM of /proc/<pid>/status
+      instead, it only grows until the child exits.
+    """
+
+    def __init__(self, process):
+        """
+        """
+        self.process = process
+        self.returncode = None
+        self.max_rss_kb = 0
+
+    def poll(self):
+        """
+          True, when the child has exited (and is reaped)
+        """
+        if self.returncode is not None:
+            return True
+
+        # before the reap, the /proc entry is gone afterwards
+        self.max_rss_kb = max(self.max_rss_kb, _vm_hwm(self.process.pid))
+
+        pid, status, usage = os.wait4(self.process.pid, os.WNOHANG)
+
+        if pid == 0:
+            return False
+
+        if os.WIFEXITED(status):
+            self.returncode = os.WEXITSTATUS(status)
+        else:
+            self.returncode = -os.WTERMSIG(status)
+
+        # Popen must not wait for it again
+        self.process.returncode = self.returncode
+
+        return True
+
+    def wait(self):
+        """
+          sample often at the start, short calls are done within milliseconds
+        """
+        delay = 0.001
+
+        while not self.poll():
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+        return self.returncode
+
+
+def _vm_hwm(pid):
+    """
+      peak rss of a running process in KiB, 0 without /proc
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (IOError, OSError, ValueError):
+        pass
+
+    return 0
+
+
+class Timings(object):
+    """
+      wall time per phase of a module run, and wall time, cpu time and
+      peak rss of the subprocesses.
+
+      disabled, every phase is a no-op and the result stays empty.
+    """
+
+    def __init__(self, enabled=False):
+        """
+        """
+        self.enabled = enabled
+        self.phases = dict()
+        self.subprocesses = dict()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        """
+        if not self.enabled:
+            yield
+            return
+
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self._count(self.phases, name, wall=time.perf_counter() - started)
+
+    @contextlib.contextmanager
+    def subprocess(self, name):
+        """
+          the cpu time of every child process, which has been waited for
+          within this block, and the largest peak rss (KiB) the caller adds
+          to the yielded list (see Child).
+        """
+        children = []
+
+        if not self.enabled:
+            yield children
+            return
+
+        before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        started = time.perf_counter()
+
+        try:
+            yield children
+        finally:
+            wall = time.perf_counter() - started
+            after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+            self._count(
+                self.subprocesses,
+                name,
+                wall=wall,
+                cpu=(after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+            )
+
+            if children:
+                entry = self.subprocesses[name]
+                entry["max_rss_kb"] = max([entry.get("max_rss_kb", 0)] + children)
+
+    def result(self):
+        """
+        """
+        if not self.enabled:
+            return dict()
+
+        result = {name: dict(entry) for name, entry in self.phases.items()}
+
+        if self.subprocesses:
+            result["subprocess"] = {name: dict(entry) for name, entry in self.subprocesses.items()}
+
+        return result
+
+    def _count(self, entries, name, **values):
+        """
+        """
+        entry = entries.setdefault(name, dict(count=0))
+        entry["count"] += 1
+
+        for key, value in values.items():
+            entry[key] = round(entry.get(key, 0) + value, 6)
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+
+# (c) 2021-2023, Bodo Schulz <bodo@boone-schulz.de>
+# Apache-2.0 (see LICENSE or https://opensource.org/license/apache-2-0/)
+# SPDX-License-Identifier: Apache-2.0
+
+# a long running local process, which keeps the cryptography stack loaded,
+# holds pre generated private keys and answers keygen / sign / dhparam
+# requests over a unix socket.
+#
+# the worker runs outside of the module (and after the module has finished),
+# therefore this file must only depend on the standard library. the
+# crypto functions are handed over as the 'crypto' namespace.
+
+from __future__ import absolute_import, print_function
+import fcntl
+import inspect
+import json
+import os
+import socket
+import subprocess
+import sys
+import syslog
+import threading
+import time
+
+__metaclass__ = type
+
+# load the module sources (given as json on stdin) and start the worker
+_BOOTSTRAP = """
+import json
+import sys
+import types
+
+modules = dict()
+
+for name, source in json.load(sys.stdin):
+    module = types.ModuleType(name)
+    exec(compile(source, name, "exec"), module.__dict__)
+    modules[name] = module
+
+socket_path, idle_timeout, keys = sys.argv[1], float(sys.argv[2]), json.loads(sys.argv[3])
+
+modules["snakeoil_worker"].KeyWorker(socket_path, idle_timeout, modules["snakeoil_crypto"], keys).serve()
+"""
+
+MAX_REQUEST_SIZE = 1024 * 1024
+
+
+class KeyWorker(object):
+    """
+      server side, one thread per connection and one thread
+      for the key pool
+    """
+
+    def __init__(self, socket_path, idle_timeout, crypto, keys=None, depth=2):
+        """
+          keys : list of [key_type, key_size], which are generated ahead
+        """
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.crypto = crypto
+        self.depth = depth
+
+        self.keys = dict()
+        self.active = 0
+        self.last_request = time.monotonic()
+        self.condition = threading.Condition()
+
+        for key_type, key_size in keys or []:
+            try:
+                crypto.check_key(key_type, key_size)
+            except ValueError as e:
+                syslog.syslog(syslog.LOG_ERR, f"snakeoil worker: {e}")
+                continue
+
+            self.keys[(key_type, key_size)] = []
+
+    def serve(self):
+        """
+        """
+        # only one worker per socket
+        lock = open(f"{self.socket_path}.lock", "w")
+
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        umask = os.umask(0o177)
+        try:
+            server.bind(self.socket_path)
+        finally:
+            os.umask(umask)
+
+        server.listen(16)
+        server.settimeout(1.0)
+
+        threading.Thread(target=self._refill, daemon=True).start()
+
+        try:
+            while not self._idle():
+                try:
+                    connection, _ = server.accept()
+                except socket.timeout:
+                    continue
+
+                with self.condition:
+                    self.active += 1
+                    self.last_request = time.monotonic()
+
+                threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+        finally:
+            server.close()
+            os.remove(self.socket_path)
+            lock.close()
+
+    def _idle(self):
+        """
+        """
+        with self.condition:
+            return self.active == 0 and time.monotonic() - self.last_request > self.idle_timeout
+
+    def _handle(self, connection):
+        """
+          one json request per connection, answered with one json response
+        """
+        try:
+            with connection:
+                connection.settimeout(None)
+                request = json.loads(_receive(connection))
+
+                try:
+                    response = self._dispatch(request.get("op"), request.get("args", {}))
+                except Exception as e:
+                    response = dict(error=f"{type(e).__name__}: {e}")
+
+                connection.sendall(json.dumps(response).encode())
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self.condition:
+                self.active -= 1
+                self.last_request = time.monotonic()
+
+    def _dispatch(self, op, args):
+        """
+        """
+        crypto = self.crypto
+
+        if op == "ping":
+            return dict(pid=os.getpid())
+
+        if op == "key":
+            return dict(key=self._take_key(args.get("key_type"), args.get("key_size")))
+
+        if op == "csr":
+            key = crypto.load_private_key(args.get("key").encode())
+            csr = crypto.build_csr(key, args.get("subject"), args.get("alt_names"), args.get("digest"))
+
+            return dict(csr=crypto.csr_pem(csr).decode())
+
+        if op == "crt":
+            key = crypto.load_private_key(args.get("key").encode())
+            csr = crypto.load_csr(args.get("csr").encode())
+            cert = crypto.build_certificate(csr, key, args.get("days"), args.get("digest"))
+
+            return dict(crt=crypto.certificate_pem(cert).decode())
+
+        if op == "dhparam":
+            return dict(dhparam=crypto.generate_dhparam(args.get("bits")).decode())
+
+        if op == "certificate":
+            not_before, not_after = crypto.certificate_dates(args.get("pem").encode())
+
+            return dict(not_before=not_before.isoformat(), not_after=not_after.isoformat())
+
+        raise ValueError(f"unknown operation '{op}'")
+
+    def _take_key(self, key_type, key_size):
+        """
+          a pre generated key if there is one, a new one otherwise
+        """
+        # only valid keys get a pool, a failing type would be retried forever
+        self.crypto.check_key(key_type, key_size)
+
+        with self.condition:
+            pool = self.keys.setdefault((key_type, key_size), [])
+            key = pool.pop() if pool else None
+            self.condition.notify_all()
+
+        if key is None:
+            key = self._generate_key(key_type, key_size)
+
+        return key
+
+    def _generate_key(self, key_type, key_size):
+        """
+        """
+        crypto = self.crypto
+
+        return crypto.private_key_pem(crypto.generate_private_key(key_type, key_size)).decode()
+
+    def _refill(self):
+        """
+          keep <depth> keys of every requested type in stock
+        """
+        while True:
+            with self.condition:
+                missing = [k for k, pool in self.keys.items() if len(pool) < self.depth]
+
+                if not missing:
+                    self.condition.wait()
+                    continue
+
+            for key_type, key_size in missing:
+                try:
+                    key = self._generate_key(key_type, key_size)
+                except Exception as e:
+                    # drop this type, the other pools are still refilled
+                    syslog.syslog(syslog.LOG_ERR, f"snakeoil worker: {key_type} {key_size} key: {type(e).__name__}: {e}")
+
+                    with self.condition:
+                        self.keys.pop((key_type, key_size), None)
+                    continue
+
+                with self.condition:
+                    self.keys[(key_type, key_size)].append(key)
+
+
+def _receive(connection):
+    """
+      read until the peer closes its side
+    """
+    chunks = []
+    size = 0
+
+    while True:
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+
+        size += len(chunk)
+        if size > MAX_REQUEST_SIZE:
+            raise ValueError("request too large")
+
+        chunks.append(chunk)
+
+    return b"".join(chunks)
+
+
+class WorkerClient(object):
+    """
+      client side, every failure ends in None.
+      the caller does the work itself in this case
+    """
+
+    def __init__(self, socket_path, timeout=600):
+        """
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.error = None
+
+    def request(self, op, **args):
+        """
+        """
+        if not os.path.exists(self.socket_path):
+            self.error = f"{self.socket_path} does not exist"
+            return None
+
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                connection.settimeout(self.timeout)
+                connection.connect(self.socket_path)
+                connection.sendall(json.dumps(dict(op=op, args=args)).encode())
+                connection.shutdown(socket.SHUT_WR)
+
+                response = json.loads(_receive(connection))
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+            return None
+
+        if "error" in response:
+            self.error = response.get("error")
+            return None
+
+        return response
+
+
+def connect_worker(socket_path, idle_timeout, keys=None):
+    """
+      the client for a running worker, None if there is no worker yet.
+      a missing worker is started in the background for the next run.
+    """
+    if WorkerClient(socket_path, timeout=5).request("ping") is not None:
+        return WorkerClient(socket_path)
+
+    start_worker(socket_path, idle_timeout, keys)
+
+    return None
+
+
+def start_worker(socket_path, idle_timeout, keys=None):
+    """
+      detached from the module, it ends after <idle_timeout> seconds
+      without a request
+    """
+    from ansible.module_utils import snakeoil_crypto
+
+    directory = os.path.dirname(socket_path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    sources = [
+        ["snakeoil_crypto", inspect.getsource(snakeoil_crypto)],
+        ["snakeoil_worker", inspect.getsource(sys.modules[__name__])],
+    ]
+
+    process = subprocess.Popen(
+        [sys.executable, "-c", _BOOTSTRAP, socket_path, str(idle_timeout), json.dumps(keys or [])],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        close_fds=True,
+        start_new_session=True,
+    )
+
+    process.stdin.write(json.dumps(sources).encode())
+    process.stdin.close()
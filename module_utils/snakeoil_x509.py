@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+# (c) 2021-2023, Bodo Schulz <bodo@boone-schulz.de>
+# Apache-2.0 (see LICENSE or https://opensource.org/license/apache-2-0/)
+# SPDX-License-Identifier: Apache-2.0
+
+# read certificate and key facts with the plain DER reader,
+# without importing cryptography or forking openssl.
+
+from __future__ import absolute_import, print_function
+import datetime
+import ipaddress
+
+from ansible.module_utils.snakeoil_asn1 import (
+    ASN1Error, BIT_STRING, INTEGER, OCTET_STRING, OID, SEQUENCE,
+    children, pem_label, pem_to_der, read_integer, read_oid, read_tlv
+)
+
+__metaclass__ = type
+
+UTC_TIME = 0x17
+GENERALIZED_TIME = 0x18
+
+KEY_ALGORITHMS = {
+    "1.2.840.113549.1.1.1": "rsa",
+    "1.2.840.10045.2.1": "ec",
+    "1.3.101.112": "ed25519",
+    "1.3.101.113": "ed448",
+}
+
+CURVES = {
+    "1.2.840.10045.3.1.7": 256,
+    "1.3.132.0.34": 384,
+    "1.3.132.0.35": 521,
+}
+
+FIXED_KEY_SIZES = {
+    "ed25519": 256,
+    "ed448": 448,
+}
+
+SUBJECT_ALT_NAME = "2.5.29.17"
+
+# GeneralName choices (context specific, primitive)
+DNS_NAME = 0x82
+IP_ADDRESS = 0x87
+
+
+def _elements(der, start=0, end=None):
+    """
+    """
+    return list(children(der, start, end))
+
+
+def _sequence(der, start=0):
+    """
+      content elements of the SEQUENCE starting at <start>
+    """
+    tag, content_start, content_end = read_tlv(der, start)
+
+    if tag != SEQUENCE:
+        raise ASN1Error(f"expected SEQUENCE, got tag {tag:#x}")
+
+    return _elements(der, content_start, content_end)
+
+
+def _algorithm(der, start, end):
+    """
+      AlgorithmIdentifier content -> (key type, curve size or None)
+    """
+    elements = _elements(der, start, end)
+
+    oid = read_oid(der, elements[0][1], elements[0][2])
+    key_type = KEY_ALGORITHMS.get(oid, oid)
+    curve = None
+
+    if key_type == "ec" and len(elements) > 1 and elements[1][0] == OID:
+        curve = CURVES.get(read_oid(der, elements[1][1], elements[1][2]))
+
+    return key_type, curve
+
+
+def _rsa_modulus_size(der, start):
+    """
+      bit length of the first INTEGER after the optional version
+      (RSAPublicKey and RSAPrivateKey)
+    """
+    integers = [read_integer(der, s, e) for t, s, e in _sequence(der, start) if t == INTEGER]
+
+    # RSAPrivateKey starts with version 0
+    modulus = integers[1] if integers[0] == 0 else integers[0]
+
+    return modulus.bit_length()
+
+
+def public_key_info(der, start, end):
+    """
+      SubjectPublicKeyInfo content -> dict(type, size)
+    """
+    algorithm, public_key = _elements(der, start, end)[:2]
+
+    key_type, size = _algorithm(der, algorithm[1], algorithm[2])
+
+    if key_type == "rsa" and public_key[0] == BIT_STRING:
+        # skip the 'unused bits' byte
+        size = _rsa_modulus_size(der, public_key[1] + 1)
+
+    return dict(
+        type=key_type,
+        size=size or FIXED_KEY_SIZES.get(key_type, 0)
+    )
+
+
+def private_key_info(data):
+    """
+      type and size of a PEM encoded private key
+      (PKCS#8, traditional RSA or EC)
+    """
+    label = pem_label(data)
+    der = pem_to_der(data, label)
+
+    if label == "RSA PRIVATE KEY":
+        return dict(type="rsa", size=_rsa_modulus_size(der, 0))
+
+    elements = _sequence(der)
+
+    if label == "EC PRIVATE KEY":
+        curve = None
+        for tag, start, end in elements:
+            if tag == 0xa0:
+                inner = read_tlv(der, start)
+                curve = CURVES.get(read_oid(der, inner[1], inner[2]))
+
+        return dict(type="ec", size=curve or 0)
+
+    if label != "PRIVATE KEY":
+        raise ASN1Error(f"unsupported private key format '{label}'")
+
+    # PKCS#8: version, AlgorithmIdentifier, OCTET STRING
+    algorithm, private_key = elements[1], elements[2]
+    key_type, size = _algorithm(der, algorithm[1], algorithm[2])
+
+    if key_type == "rsa" and private_key[0] == OCTET_STRING:
+        size = _rsa_modulus_size(der, private_key[1])
+
+    return dict(
+        type=key_type,
+        size=size or FIXED_KEY_SIZES.get(key_type, 0)
+    )
+
+
+def tbs_certificate(der):
+    """
+      fields of the TBSCertificate, without the optional version:
+      serial, signature, issuer, validity, subject, subjectPublicKeyInfo, [extensions]
+    """
+    tag, start, end = read_tlv(der)
+    fields = _sequence(der, start)
+
+    if fields[0][0] == 0xa0:
+        fields = fields[1:]
+
+    return fields
+
+
+def certificate_key_info(data):
+    """
+      type and size of the public key in a PEM encoded certificate
+    """
+    der = pem_to_der(data, "CERTIFICATE")
+    spki = tbs_certificate(der)[5]
+
+    return public_key_info(der, spki[1], spki[2])
+
+
+def _read_time(der, tag, start, end):
+    """
+      UTCTime / GeneralizedTime -> timezone aware datetime (UTC)
+    """
+    value = der[start:end].decode("ascii").rstrip("Z")
+
+    if tag == UTC_TIME:
+        year = int(value[:2])
+        value = f"{1900 + year if year >= 50 else 2000 + year}{value[2:]}"
+    elif tag != GENERALIZED_TIME:
+        raise ASN1Error(f"unexpected time tag {tag:#x}")
+
+    # fractional seconds are allowed in GeneralizedTime
+    value = value.split(".")[0]
+
+    return datetime.datetime.strptime(value, "%Y%m%d%H%M%S").replace(tzinfo=datetime.timezone.utc)
+
+
+def certificate_validity(data):
+    """
+      (notBefore, notAfter) of a PEM encoded certificate as UTC datetimes
+    """
+    der = pem_to_der(data, "CERTIFICATE")
+    validity = tbs_certificate(der)[3]
+
+    not_before, not_after = _elements(der, validity[1], validity[2])[:2]
+
+    return _read_time(der, *not_before), _read_time(der, *not_after)
+
+
+def _extension(der, fields, oid):
+    """
+      (start, end) of the extnValue content with the given oid, None if missing
+    """
+    for tag, start, end in fields[6:]:
+        if tag != 0xa3:
+            continue
+
+        for _, ext_start, ext_end in _sequence(der, start):
+            elements = _elements(der, ext_start, ext_end)
+
+            if read_oid(der, elements[0][1], elements[0][2]) == oid:
+                return elements[-1][1], elements[-1][2]
+
+    return None
+
+
+def certificate_alt_names(data):
+    """
+      subjectAltName of a PEM encoded certificate as list of [type, value],
+      type is 'DNS' or 'IP'
+    """
+    der = pem_to_der(data, "CERTIFICATE")
+    value = _extension(der, tbs_certificate(der), SUBJECT_ALT_NAME)
+
+    if value is None:
+        return []
+
+    result = []
+
+    for tag, start, end in _sequence(der, value[0]):
+        if tag == DNS_NAME:
+            result.append(["DNS", der[start:end].decode("ascii")])
+        elif tag == IP_ADDRESS:
+            result.append(["IP", str(ipaddress.ip_address(der[start:end]))])
+
+    return result
@@ -2,10 +2,14 @@
 from ansible.parsing.dataloader import DataLoader
 from ansible.template import Templar
 
+import datetime
+import ipaddress
 import json
 import pytest
 import os
+import re
 import ssl
+import subprocess
 
 import testinfra.utils.ansible_runner
 
@@ -98,6 +102,54 @@ def get_vars(host):
     return result
 
 
+def verify_results(get_vars):
+    """
+      module results, saved by the converge in snakeoil_verify_directory
+    """
+    file_name = os.path.join(get_vars.get("snakeoil_verify_directory"), "results.json")
+
+    with open(file_name) as f:
+        return json.load(f)
+
+
+def verify_certificate(get_vars, domain, name=None):
+    """
+      certificate of the converge on the ansible controller
+    """
+    return os.path.join(get_vars.get("snakeoil_verify_directory"), domain, name or f"{domain}.crt")
+
+
+def openssl_x509(file_name, *args):
+    """
+      output of 'openssl x509 -noout <args>'
+    """
+    return subprocess.run(
+        ["openssl", "x509", "-noout", "-in", file_name] + list(args),
+        check=True,
+        capture_output=True,
+        text=True).stdout
+
+
+def openssl_alt_names(file_name):
+    """
+      subjectAltName as list of [type, value], like the module returns it
+    """
+    output = openssl_x509(file_name, "-ext", "subjectAltName")
+    # the first line is the name of the extension
+    values = output.splitlines()[1].strip().split(", ")
+
+    result = []
+
+    for value in values:
+        kind, name = value.split(":", 1)
+        if kind == "IP Address":
+            result.append(["IP", str(ipaddress.ip_address(name))])
+        else:
+            result.append([kind, name])
+
+    return result
+
+
 def test_directories(host, get_vars):
     """
     """
@@ -172,3 +224,72 @@ def test_cert(host, get_vars):
                         assert i in alt_ips
         else:
             assert False, f"file {cert_file_name} is not present on ansible controller"
+
+
+def test_parser_against_openssl(get_vars):
+    """
+      the facts of the asn1 / x509 parser (state: inspect) and openssl x509
+    """
+    key_algorithms = {
+        "rsaEncryption": "rsa",
+        "id-ecPublicKey": "ec",
+        "ED25519": "ed25519",
+    }
+
+    results = verify_results(get_vars).get("inspect")
+
+    for key_type in get_vars.get("snakeoil_verify_key_types"):
+        facts = results.get(key_type)
+        cert_file_name = verify_certificate(get_vars, f"{key_type}.verify.local")
+
+        not_after = openssl_x509(cert_file_name, "-enddate").strip().split("=", 1)[1]
+        not_after = datetime.datetime.strptime(not_after, "%b %d %H:%M:%S %Y GMT")
+
+        assert facts.get("expire_date") == not_after.strftime("%Y-%m-%d %H:%M:%S")
+        assert facts.get("alt_names") == openssl_alt_names(cert_file_name)
+
+        text = openssl_x509(cert_file_name, "-text")
+        algorithm = re.search(r"Public Key Algorithm: (\S+)", text).group(1)
+        # ed25519 keys have no size in the output
+        bits = re.search(r"Public-Key: \((\d+) bit\)", text)
+
+        assert facts.get("key_type") == key_type == key_algorithms.get(algorithm)
+        if bits:
+            assert facts.get("key_size") == int(bits.group(1))
+
+
+def test_manifest(get_vars):
+    """
+      create, the same inputs again, another alt name
+    """
+    created, unchanged, changed = verify_results(get_vars).get("manifest")
+
+    assert set(created) == {"conf", "key", "csr", "crt", "pem", "dhparam"}
+    # nothing is created again
+    assert unchanged == []
+    # a new alt name needs a new request and certificate for the same key
+    assert set(changed) == {"conf", "csr", "crt", "pem"}
+
+
+def test_alt_names(get_vars):
+    """
+      normalized (lowercase, IDNA, compressed IPs, no duplicates), sorted
+      and split into certificates with at most 3 alt names
+    """
+    wanted = {
+        "san.verify.local.crt": [
+            ["DNS", "*.san.verify.local"],
+            ["DNS", "a.san.verify.local"],
+            ["DNS", "www.san.verify.local"],
+        ],
+        "san.verify.local.2.crt": [
+            ["DNS", "xn--bcher-kva.verify.local"],
+            ["IP", "192.168.2.1"],
+            ["IP", "2001:db8::1"],
+        ],
+    }
+
+    assert verify_results(get_vars).get("san") == list(wanted.keys())
+
+    for name, alt_names in wanted.items():
+        assert openssl_alt_names(verify_certificate(get_vars, "san.verify.local", name)) == alt_names